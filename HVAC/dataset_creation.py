@@ -1,41 +1,92 @@
-import pandas as pd
+import os
 
-df = pd.read_csv("ashrae_db2.01.csv", low_memory=False)
+import pandas as pd
 
-# Keep only needed columns
-columns_to_keep = ["Age", "Sex", "Air temperature (C)", "Thermal comfort"]
-df = df[columns_to_keep]
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE_CSV = os.path.join(HERE, "ashrae_db2.01.csv")
+EDGE_CSV = os.path.join(HERE, "dataset_edge.csv")
+# Cleaned dataset cache, only written when a Parquet engine (pyarrow) is installed
+CACHE_PARQUET = os.path.join(HERE, "dataset_edge.parquet")
 
-# Rename columns
-df = df.rename(columns={
+# Only these columns are read from the ASHRAE database, with explicit dtypes
+SOURCE_COLUMNS = {
+    "Age": "float32",
+    "Sex": "category",
+    "Air temperature (C)": "float32",
+    "Thermal comfort": "string",   # contains non-numeric entries, parsed below
+}
+RENAME = {
     "Air temperature (C)": "Temperature",
     "Thermal comfort": "Comfort"
-})
+}
+# Cleaned dataset schema
+EDGE_DTYPES = {"Age": "int16", "Sex": "int8", "Temperature": "float32", "Comfort": "int8"}
+
+CHUNK_ROWS = 100_000
+
+
+def clean_chunk(df):
+    """Clean one chunk of the ASHRAE database to the Age/Sex/Temperature/Comfort schema."""
+    df = df.rename(columns=RENAME)
+
+    # Convert Sex to numeric, other values become NaN
+    df["Sex"] = df["Sex"].map({"Male": 1, "Female": 0}).astype("float32")
+
+    # Replace non-numeric entries with NaN
+    df["Comfort"] = pd.to_numeric(df["Comfort"], errors="coerce")
+
+    # Drop missing values
+    df = df.dropna()
+
+    # Comfortable when the vote is 5 or more
+    df["Comfort"] = df["Comfort"] >= 5
+    return df.astype(EDGE_DTYPES)
+
+
+def build_dataset(source=SOURCE_CSV, chunksize=CHUNK_ROWS):
+    """Read only the needed columns of the ASHRAE CSV in chunks and return the cleaned dataset."""
+    chunks = pd.read_csv(
+        source,
+        usecols=list(SOURCE_COLUMNS),
+        dtype=SOURCE_COLUMNS,
+        chunksize=chunksize
+    )
+    df = pd.concat((clean_chunk(chunk) for chunk in chunks), ignore_index=True)
+    return df[list(EDGE_DTYPES)]
 
-# Drop remaining missing values
-df.dropna(inplace=True)
 
-df["Age"] = df["Age"].astype(int)
+def write_cache(df, path=CACHE_PARQUET):
+    """Cache the cleaned dataset as Parquet. Returns False when no Parquet engine is installed."""
+    try:
+        df.to_parquet(path, index=False)
+        return True
+    except ImportError:
+        return False
 
-# Convert Sex to numeric
-df["Sex"] = df["Sex"].map({"Male": 1, "Female": 0})
 
-# Replace non-numeric entries with NaN
-df["Comfort"] = pd.to_numeric(df["Comfort"], errors="coerce")
+def load_dataset(edge_csv=EDGE_CSV, cache=CACHE_PARQUET):
+    """Load the cleaned dataset, from the Parquet cache when it is newer than the CSV."""
+    if os.path.exists(cache) and (not os.path.exists(edge_csv)
+                                  or os.path.getmtime(cache) >= os.path.getmtime(edge_csv)):
+        try:
+            return pd.read_parquet(cache)
+        except ImportError:
+            pass
 
-# Drop rows where Comfort could not be converted
-df = df.dropna(subset=["Comfort"])
+    df = pd.read_csv(edge_csv, usecols=list(EDGE_DTYPES), dtype=EDGE_DTYPES)
+    write_cache(df, cache)
+    return df
 
-df["Comfort"] = df["Comfort"].astype(int)
-# Keep only rows where Comfort is NOT 5
-#df = df[df["Comfort"] != 5]
-df["Comfort"] = (df["Comfort"] >= 5).astype(int)
 
-counts = df["Comfort"].value_counts()
-print(counts)
+if __name__ == "__main__":
+    df = build_dataset()
 
-# Add timestamp column (needed for Edge Impulse)
-#df.insert(0, "timestamp", range(0, len(df)*100, 100))
+    counts = df["Comfort"].value_counts()
+    print(counts)
 
-# Save final CSV
-df.to_csv("dataset_edge.csv", index=False)
+    # Save final CSV (also used by Edge Impulse) and the Parquet cache
+    df.to_csv(EDGE_CSV, index=False)
+    if write_cache(df):
+        print(f"Cached {len(df)} rows in {CACHE_PARQUET}")
+    else:
+        print("pyarrow not installed, Parquet cache skipped")
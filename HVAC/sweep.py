@@ -0,0 +1,151 @@
+"""
+Parallel sweep of the comfort classifier: age bins x regularization (C) x threshold.
+
+The cleaned dataset is copied once into shared memory as a NumPy array, every
+worker of the process pool maps the same buffer. Each (bins, C) candidate gets
+the out-of-fold accuracy of every threshold (same CV as train_model.py), then
+is fitted on the train split and run through ComfortML on the held-out split,
+giving the accuracy the firmware would reach and the per-reading latency of
+the float path (predict) and the switch table path (predict_label).
+Latencies are measured on this machine, compare them relative to each other.
+
+Run from the HVAC folder: python sweep.py [workers]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import train_test_split
+
+from dataset_creation import load_dataset
+from train_model import age_classes, select_threshold, SEED, THRESHOLDS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from comfort_HVAC import ComfortML
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sweep_results.csv")
+
+# Age bins in years, ComfortML expects 4 age classes
+BIN_CANDIDATES = [
+    (0, 30, 45, 60, 120),
+    (0, 25, 40, 55, 120),
+    (0, 35, 50, 65, 120),
+    (0, 30, 40, 50, 120),
+    (0, 25, 35, 45, 120),
+]
+C_CANDIDATES = (0.01, 0.1, 1.0, 10.0)
+
+COLUMNS = ("Age", "Sex", "Temperature", "Comfort")
+
+# Dataset view of the worker process, set by _attach
+_shm = None
+_data = None
+
+
+def _attach(name, shape, dtype):
+    """Pool initializer: map the shared dataset without copying it."""
+    global _shm, _data
+    _shm = shared_memory.SharedMemory(name=name)
+    _data = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+
+
+def comfort_model(scaler, model, threshold):
+    """ComfortML with the fitted parameters, as the firmware would load them."""
+    ml = ComfortML(params_file=None)
+    ml.weights = [float(w) for w in model.coef_[0]]
+    ml.bias = float(model.intercept_[0])
+    ml.mean = [float(m) for m in scaler.mean_]
+    ml.scale = [float(s) for s in scaler.scale_]
+    ml.threshold = float(threshold)
+    ml.build_table()
+    return ml
+
+
+def per_call_us(fn, rows):
+    """Mean time of fn(age, sex, temperature) per row, in microseconds, with the results."""
+    start = time.perf_counter()
+    results = [fn(a, s, t) for a, s, t in rows]
+    return (time.perf_counter() - start) / len(rows) * 1e6, results
+
+
+def evaluate(age_bins, C):
+    """Every threshold of one (bins, C) candidate, one result row per threshold."""
+    X = np.column_stack([age_classes(_data[:, 0], age_bins), _data[:, 1], _data[:, 2]])
+    y = _data[:, 3].astype(np.int8)
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=SEED
+    )
+    _, _, cv_scores = select_threshold(X_train, y_train, C=C)
+
+    scaler = StandardScaler()
+    model = LogisticRegression(C=C)
+    model.fit(scaler.fit_transform(X_train), y_train)
+
+    rows = [(int(a), int(s), float(t)) for a, s, t in X_test.tolist()]
+    ml = comfort_model(scaler, model, 0.5)
+    predict_us, _ = per_call_us(ml.predict, rows)
+
+    results = []
+    for threshold, cv_accuracy in zip(THRESHOLDS, cv_scores):
+        ml.threshold = float(threshold)
+        ml.build_table()
+        table_us, labels = per_call_us(ml.predict_label, rows)
+        results.append({
+            "bins": "-".join(str(b) for b in age_bins),
+            "C": C,
+            "threshold": float(threshold),
+            "cv_accuracy": round(float(cv_accuracy), 6),
+            "comfortml_accuracy": round(float(np.mean(np.array(labels) == y_test)), 6),
+            "predict_us": round(predict_us, 3),
+            "table_us": round(table_us, 3),
+        })
+    return results
+
+
+def sweep(workers=None):
+    """Run every candidate on a process pool, return the results ranked by CV accuracy."""
+    df = load_dataset()
+    data = df[list(COLUMNS)].to_numpy(dtype=np.float64)
+
+    shape, dtype = data.shape, data.dtype.str
+
+    shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf)[:] = data
+        del data, df
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_attach,
+                                 initargs=(shm.name, shape, dtype)) as pool:
+            futures = [pool.submit(evaluate, age_bins, C)
+                       for age_bins in BIN_CANDIDATES for C in C_CANDIDATES]
+            results = [row for future in futures for row in future.result()]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    ranked = pd.DataFrame(results).sort_values(
+        ["cv_accuracy", "comfortml_accuracy", "table_us"], ascending=[False, False, True]
+    )
+    ranked.insert(0, "rank", range(1, len(ranked) + 1))
+    return ranked
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    start = time.perf_counter()
+    ranked = sweep(workers)
+    elapsed = time.perf_counter() - start
+
+    ranked.to_csv(RESULTS_FILE, index=False)
+    print(ranked.head(10).to_string(index=False))
+    print(f"\n{len(ranked)} candidates in {elapsed:.1f}s, results in {RESULTS_FILE}")
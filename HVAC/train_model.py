@@ -1,80 +1,179 @@
-import pandas as pd
+import hashlib
+import json
+import os
+
 import numpy as np
+import pandas as pd
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_predict
 from sklearn.metrics import accuracy_score
 
-# Load dataset
-df = pd.read_csv("dataset_edge.csv")
+from dataset_creation import load_dataset
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Loaded by ComfortML on the Pico (upload it with the other src/ files)
+PARAMS_FILE = os.path.join(HERE, "..", "src", "comfort_params.json")
+# Bump when the layout of the params file changes (checked by ComfortML)
+PARAMS_FORMAT = 1
+# Comfort probability surface: NPZ for the backend, CSV for the firmware table
+CURVE_NPZ = os.path.join(HERE, "..", "src", "comfort_curve.npz")
+CURVE_CSV = os.path.join(HERE, "..", "src", "comfort_curve.csv")
+CURVE_RANGE = (10.0, 40.0)  # °C
+CURVE_STEP = 0.1            # ComfortML rounds readings to 0.1 °C
+
+SEED = 42
+CV_FOLDS = 5
+# Candidate comfort thresholds for the cross-validated selection
+THRESHOLDS = np.round(np.arange(0.30, 0.81, 0.01), 2)
 
 bins = [0, 30, 45, 60, 120]
-labels = [0, 1, 2, 3]
-
-df["AgeClass"] = pd.cut(df["Age"], bins=bins, labels=labels, right=True)
-df["AgeClass"] = df["AgeClass"].astype(int)
-df.drop(columns=["Age"], inplace=True)
-
-
-X = df[["AgeClass", "Sex", "Temperature"]].values
-y = df["Comfort"].values  # 0 / 1
-
-# Normalize features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# Train / test split
-X_train, X_test, y_train, y_test = train_test_split(
-    X_scaled, y, test_size=0.2, random_state=42
-)
-
-# Train logistic regression
-model = LogisticRegression()
-model.fit(X_train, y_train)
-
-# Evaluate
-y_prob = model.predict_proba(X_test)[:, 1]
-
-# Custom threshold
-threshold = 0.6
-y_pred = (y_prob >= threshold).astype(int)
-print("Accuracy:", accuracy_score(y_test, y_pred))
-
-# Extract parameters
-weights = model.coef_[0]
-bias = model.intercept_[0]
-
-print("\n=== MODEL PARAMETERS ===")
-print("Weights:", weights)
-print("Bias:", bias)
-print("\n=== SCALER PARAMETERS ===")
-print("Mean:", scaler.mean_)
-print("Scale:", scaler.scale_)
-
-# 0=female, 1=male
-sex_encoded = 1
-age = 70
-if age < 30:
-    age_class = 0
-elif age < 45:
-    age_class = 1
-elif age < 60:
-    age_class = 2
-else:
-    age_class = 3
-
-for temp in range(16, 35):
-    # Create a single observation
-    x_prova = np.array([[age_class, sex_encoded, temp]])
-    
-    # Scale the observation
-    x_prova_scaled = scaler.transform(x_prova)
-    
-    # Predict
-    prova = model.predict_proba(x_prova_scaled)[0][1]
-    print(prova)
-    if prova >= 0.63:
-        output = 1
-    else:
-        output = 0
-    print(f"Temperature={temp} => Comfort={output}")
+
+
+def age_classes(age, age_bins=bins):
+    """Age in years to age class 0..len(age_bins) - 2."""
+    return pd.cut(age, bins=age_bins, labels=range(len(age_bins) - 1), right=True).astype(int)
+
+
+def load_features():
+    """Cleaned dataset as X (AgeClass, Sex, Temperature) and y (Comfort 0 / 1)."""
+    df = load_dataset()
+    df["AgeClass"] = age_classes(df["Age"])
+
+    X = df[["AgeClass", "Sex", "Temperature"]].to_numpy(dtype=np.float64)
+    y = df["Comfort"].to_numpy()  # 0 / 1
+    return X, y
+
+
+def select_threshold(X, y, thresholds=THRESHOLDS, folds=CV_FOLDS, seed=SEED, C=1.0):
+    """Pick the threshold with the best out-of-fold accuracy.
+    Returns (threshold, accuracy, accuracy per candidate)."""
+    pipeline = make_pipeline(StandardScaler(), LogisticRegression(C=C))
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    y_prob = cross_val_predict(pipeline, X, y, cv=cv, method="predict_proba")[:, 1]
+
+    # one row per candidate threshold
+    scores = ((y_prob[None, :] >= thresholds[:, None]) == y[None, :]).mean(axis=1)
+    best = int(np.argmax(scores))
+    return float(thresholds[best]), float(scores[best]), scores
+
+
+def train(X, y, seed=SEED):
+    """Fit scaler and model on the train split, select the threshold by CV on it
+    and report the held-out accuracy. Returns (scaler, model, threshold, metrics)."""
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=seed
+    )
+
+    threshold, cv_accuracy, _ = select_threshold(X_train, y_train, seed=seed)
+
+    # Normalize features
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+
+    # Train logistic regression
+    model = LogisticRegression()
+    model.fit(X_train_scaled, y_train)
+
+    # Evaluate
+    y_prob = model.predict_proba(scaler.transform(X_test))[:, 1]
+    y_pred = (y_prob >= threshold).astype(int)
+    metrics = {
+        "cv_accuracy": round(cv_accuracy, 6),
+        "test_accuracy": round(float(accuracy_score(y_test, y_pred)), 6),
+        "samples": int(len(y)),
+    }
+    return scaler, model, threshold, metrics
+
+
+def export_params(scaler, model, threshold, metrics, X, y, path=PARAMS_FILE):
+    """Write the parameters ComfortML needs. The version is a hash of the
+    training data and the parameters, so the same data gives the same file."""
+    params = {
+        "format": PARAMS_FORMAT,
+        "features": ["age_class", "sex", "temperature"],
+        "age_bins": bins,
+        "weights": [float(w) for w in model.coef_[0]],
+        "bias": float(model.intercept_[0]),
+        "mean": [float(m) for m in scaler.mean_],
+        "scale": [float(s) for s in scaler.scale_],
+        "threshold": threshold,
+        "metrics": metrics,
+    }
+
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    params["version"] = digest.hexdigest()[:12]
+
+    with open(path, "w") as f:
+        json.dump(params, f, indent=2)
+        f.write("\n")
+    return params
+
+
+def comfort_surface(scaler, model, t_range=CURVE_RANGE, step=CURVE_STEP, age_bins=bins):
+    """Comfort probability for every age class x sex x temperature in one call.
+    Returns (temperatures, probability[age_class, sex, temperature])."""
+    n_steps = int(round((t_range[1] - t_range[0]) / step)) + 1
+    temperatures = np.round(t_range[0] + np.arange(n_steps) * step, 6)
+
+    age, sex, temp = np.meshgrid(np.arange(len(age_bins) - 1), np.arange(2), temperatures, indexing="ij")
+    X = np.column_stack([age.ravel(), sex.ravel(), temp.ravel()]).astype(np.float64)
+    probability = model.predict_proba(scaler.transform(X))[:, 1].reshape(age.shape)
+    return temperatures, probability
+
+
+def export_curve(temperatures, probability, threshold, version, npz_path=CURVE_NPZ, csv_path=CURVE_CSV):
+    """Write the surface as compressed NPZ and as CSV, one row per temperature and
+    one column per (age class, sex). Both carry the params version and threshold."""
+    np.savez_compressed(
+        npz_path,
+        temperature=temperatures.astype(np.float32),
+        probability=probability.astype(np.float32),
+        threshold=np.float64(threshold),
+        version=np.array(version)
+    )
+
+    n_age, n_sex, _ = probability.shape
+    columns = probability.reshape(n_age * n_sex, -1).T  # column index = age * 2 + sex
+    header = "temperature," + ",".join(f"a{a}s{s}" for a in range(n_age) for s in range(n_sex))
+    with open(csv_path, "w") as f:
+        f.write(f"# version={version} threshold={threshold}\n")
+        f.write(header + "\n")
+        for t, row in zip(temperatures, columns):
+            f.write(f"{t:.1f}," + ",".join(f"{p:.6f}" for p in row) + "\n")
+
+
+if __name__ == "__main__":
+    X, y = load_features()
+    scaler, model, threshold, metrics = train(X, y)
+
+    print(f"Threshold (CV): {threshold}")
+    print("CV accuracy:", metrics["cv_accuracy"])
+    print("Accuracy:", metrics["test_accuracy"])
+
+    # Extract parameters
+    weights = model.coef_[0]
+    bias = model.intercept_[0]
+
+    print("\n=== MODEL PARAMETERS ===")
+    print("Weights:", weights)
+    print("Bias:", bias)
+    print("\n=== SCALER PARAMETERS ===")
+    print("Mean:", scaler.mean_)
+    print("Scale:", scaler.scale_)
+
+    params = export_params(scaler, model, threshold, metrics, X, y)
+    print(f"\nExported params version {params['version']} to {os.path.normpath(PARAMS_FILE)}")
+
+    temperatures, probability = comfort_surface(scaler, model)
+    export_curve(temperatures, probability, threshold, params["version"])
+    print(f"Exported comfort surface {probability.shape} to {os.path.normpath(CURVE_NPZ)} and .csv")
+
+    # Comfort curve of a 70 year old male (age class 3, sex 1) at whole degrees
+    for temp in range(16, 35):
+        prob = probability[3, 1, int(round((temp - CURVE_RANGE[0]) / CURVE_STEP))]
+        print(f"Temperature={temp} => p={prob:.4f} Comfort={int(prob >= threshold)}")
@@ -6,6 +6,8 @@ import '../models/sensor_data.dart';
 class ApiService {
   static const String baseUrl = 'http://192.168.43.194:5000';
   static const Duration timeoutDuration = Duration(seconds: 10);
+  // Server-side LTTB downsampling, more points than this cannot be told apart on a phone chart
+  static const int maxPoints = 500;
   
   Future<SensorData> getTemperature({String range = '-6h'}) async {
     return _getData('/temperature', range, 'Temperature (°C)');
@@ -21,7 +23,7 @@ class ApiService {
   
   Future<SensorData> _getData(String endpoint, String range, String label) async {
     try {
-      String url = '$baseUrl$endpoint?range=$range';
+      String url = '$baseUrl$endpoint?range=$range&max_points=$maxPoints';
       print(' Calling: $url');
       
       final response = await http.get(Uri.parse(url)).timeout(timeoutDuration);
@@ -0,0 +1,95 @@
+import threading
+import time
+
+
+class _Flight:
+    """A computation in progress that concurrent callers of the same key wait on."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """In-process TTL cache with single-flight request coalescing.
+
+    Concurrent misses on the same key share one computation: the first caller
+    runs it, the others wait for its result. Hit/miss counters are kept per
+    namespace (the route name in the Flask API).
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = {}    # key -> (expires_at, value)
+        self._inflight = {}   # key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {}      # namespace -> counters
+
+    def _counters(self, namespace):
+        counters = self._stats.get(namespace)
+        if counters is None:
+            counters = self._stats[namespace] = {"hits": 0, "misses": 0, "coalesced": 0}
+        return counters
+
+    def _store(self, key, ttl, value):
+        now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            # purge expired entries first, then the oldest ones
+            for k in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[k]
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (now + ttl, value)
+
+    def get_or_compute(self, namespace, key, ttl, compute):
+        """Return the cached value for (namespace, key), computing it once on a miss."""
+        key = (namespace, key)
+        with self._lock:
+            counters = self._counters(namespace)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                counters["hits"] += 1
+                return entry[1]
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                counters["misses"] += 1
+            else:
+                counters["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            if ttl > 0:
+                with self._lock:
+                    self._store(key, ttl, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def clear(self):
+        """Drop every cached entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Return per-namespace counters plus totals and the current entry count."""
+        with self._lock:
+            routes = {name: dict(counters) for name, counters in self._stats.items()}
+            entries = len(self._entries)
+        totals = {"hits": 0, "misses": 0, "coalesced": 0}
+        for counters in routes.values():
+            for k in totals:
+                totals[k] += counters[k]
+        return {"routes": routes, "total": totals, "entries": entries}
@@ -1,8 +1,16 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, abort, Response, stream_with_context
 from influxdb_client import InfluxDBClient
-from influxdb_client.client.flux_table import FluxTable
 from flask_cors import CORS
+from functools import wraps
+from api_cache import TTLCache
+from series_window import SeriesWindow, flux_time, parse_since
+from influx_columns import query_columns, format_times, values_to_list, numeric_values
+from downsample import downsample
+from comfort_scoring import ComfortScorer, load_surface
+import user_registry
+import json
 import os
+import re
 import sys
 
 app = Flask(__name__)
@@ -21,84 +29,128 @@ if not INFLUX_TOKEN:
 client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=ORG)
 query_api = client.query_api()
 
-def query_influx(flux_query):
-    """Executes a Flux query and returns x (time) and y (values)"""
-    tables = query_api.query(flux_query)
-    xvalues = []
-    yvalues = []
+# Response cache: TTL in seconds per route, data only changes every PUBLISH_INTERVAL
+# Override with env variables, e.g. CACHE_TTL_PRESSURE=10 (0 disables caching)
+DEFAULT_CACHE_TTL = 5
+CACHE_TTL = {
+    "temperature": 5,
+    "pressure": 5,
+    "air_density": 10,
+    "temperature_alerts": 10,
+    "ml_predictions": 15,
+    "latency": 5,
+    "temperature_count": 30,
+    "comfort": 10,
+}
+for _route in CACHE_TTL:
+    CACHE_TTL[_route] = float(os.getenv(f"CACHE_TTL_{_route.upper()}", CACHE_TTL[_route]))
+
+cache = TTLCache()
+
+def cached(route):
+    """Cache a view's JSON data per query string, concurrent identical requests share one Influx query"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            ttl = CACHE_TTL.get(route, DEFAULT_CACHE_TTL)
+            key = request.query_string
+            return jsonify(cache.get_or_compute(route, key, ttl, lambda: view(*args, **kwargs)))
+        return wrapper
+    return decorator
+
+STREAM_CHUNK = 500  # NDJSON lines per written chunk
+
+def stream_points(flux_query):
+    """Stream query results as NDJSON ({"x": ..., "y": ...} per line) straight from the Influx record iterator"""
+    def generate():
+        lines = []
+        for record in query_api.query_stream(flux_query):
+            lines.append(json.dumps({"x": record.get_time().strftime("%H:%M:%S"), "y": record.get_value()}))
+            if len(lines) == STREAM_CHUNK:
+                yield "\n".join(lines) + "\n"
+                lines.clear()
+        if lines:
+            yield "\n".join(lines) + "\n"
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
-    for table in tables:
-        for record in table.records:
-            xvalues.append(record.get_time().strftime("%H:%M:%S"))
+def streamable(flux_builder, default_start):
+    """With format=ndjson, bypass cache and windows and stream the route's query, memory stays flat.
+    flux_builder(start) builds the query, start comes from since= or default_start"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.args.get("format") != "ndjson":
+                return view(*args, **kwargs)
             try:
-                yvalues.append(record.get_value())
-            except:
-                yvalues.append(None)
-    return xvalues, yvalues
+                since = parse_since(request.args.get("since"))
+            except ValueError:
+                abort(400, description="since must be RFC3339 or epoch seconds")
+            return stream_points(flux_builder(flux_time(since) if since else default_start))
+        return wrapper
+    return decorator
 
-# Temperature endpoint
-@app.route('/temperature', methods=['GET'])
-def temperature():
-    flux_query = f'''
+def query_influx_points(flux_query):
+    """Executes a Flux query and returns times (datetime64) and values as NumPy columns"""
+    return query_columns(query_api, flux_query)
+
+def query_influx(flux_query):
+    """Executes a Flux query and returns x (time) and y (values)"""
+    times, values = query_influx_points(flux_query)
+    return format_times(times), values_to_list(values)
+
+# Flux queries, start is a Flux time literal (or a relative duration like -6h)
+def temperature_flux(start):
+    return f'''
     from(bucket:"{BUCKET}")
-      |> range(start: -1h)
+      |> range(start: {start})
       |> filter(fn: (r) => r._measurement == "weather" and r._field == "temperature")
     '''
-    x, y = query_influx(flux_query)
-    return jsonify({"x": x, "y": y})
 
-
-# Pressure endpoint
-@app.route('/pressure', methods=['GET'])
-def pressure():
-    flux_query = f'''
+def pressure_flux(start):
+    return f'''
     from(bucket:"{BUCKET}")
-      |> range(start: -6h)
+      |> range(start: {start})
       |> filter(fn: (r) => r._measurement == "weather" and r._field == "pressure")
     '''
-    x, y = query_influx(flux_query)
-    return jsonify({"x": x, "y": y})
 
-# Air density trend endpoint
-@app.route('/air_density', methods=['GET'])
-def air_density():
+def air_density_flux(start):
     R = 287.05  # specific gas constant
-    flux_query = f'''
+    return f'''
     temperature = from(bucket:"{BUCKET}")
-      |> range(start: -6h)
+      |> range(start: {start})
       |> filter(fn: (r) => r._measurement == "weather" and r._field == "temperature")
       |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
 
     pressure = from(bucket:"{BUCKET}")
-      |> range(start: -6h)
+      |> range(start: {start})
       |> filter(fn: (r) => r._measurement == "weather" and r._field == "pressure")
       |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
 
     join(tables: {{T: temperature, P: pressure}}, on: ["_time"])
       |> map(fn: (r) => ({{_time: r._time, _value: r.pressure / ( {R} * (r.temperature + 273.15) ), _field: "Air density trend"}}))
     '''
-    x, y = query_influx(flux_query)
-    return jsonify({"x": x, "y": y})
 
-# Temperature alerts endpoint
-@app.route('/temperature_alerts', methods=['GET'])
-def temperature_alerts():
-    flux_query = f'''
+def temperature_alerts_flux(start, newest_first=False):
+    sort = '|> sort(columns: ["_time"], desc: true)' if newest_first else ""
+    return f'''
     from(bucket:"{BUCKET}")
-      |> range(start: -6h)
+      |> range(start: {start})
       |> filter(fn: (r) => r._measurement == "temperature_alerts" and r._field == "status")
-      |> sort(columns: ["_time"], desc: true)
+      {sort}
     '''
-    x, y = query_influx(flux_query)
-    return jsonify({"x": x, "y": y})
 
-# ML Predictions and current temperature endpoint
-@app.route('/ml_predictions', methods=['GET'])
-def ml_predictions():
-    flux_query = f'''
+def latency_flux(start):
+    return f'''
+    from(bucket:"{BUCKET}")
+      |> range(start: {start})
+      |> filter(fn: (r) => r._field == "latency_ms")
+    '''
+
+def ml_predictions_flux(start):
+    return f'''
     predictions =
     from(bucket:"{BUCKET}")
-      |> range(start: -6h)
+      |> range(start: {start})
       |> filter(fn: (r) => r._measurement == "ml_predictions")
       |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
       |> filter(fn: (r) => r.timeframe_min == 5 or r.timeframe_min == 15 or r.timeframe_min == 30)
@@ -116,36 +168,215 @@ def ml_predictions():
 
     union(tables: [predictions, current])
     '''
+
+def temperature_count_flux(start):
+    return f'''
+    from(bucket:"{BUCKET}")
+      |> range(start: {start})
+      |> filter(fn: (r) => r._measurement == "weather" and r._field == "temperature")
+      |> aggregateWindow(every: 1m, fn: count)
+    '''
+
+# In-memory windows, each poll only re-fetches the last LATE_DATA_SECONDS
+HOUR = 3600
+# Readings reach Influx up to this late with their sample time: the Pico's offline
+# buffer replays up to OFFLINE_BUFFER_CAPACITY x PUBLISH_INTERVAL (720 x 5 s) of them
+LATE_DATA_SECONDS = float(os.getenv("LATE_DATA_SECONDS", 1 * HOUR))
+WINDOWS = {
+    "temperature": SeriesWindow(1 * HOUR, lambda start: query_influx_points(temperature_flux(start)),
+                                LATE_DATA_SECONDS),
+    "pressure": SeriesWindow(6 * HOUR, lambda start: query_influx_points(pressure_flux(start)),
+                             LATE_DATA_SECONDS),
+    "air_density": SeriesWindow(6 * HOUR, lambda start: query_influx_points(air_density_flux(start)),
+                                LATE_DATA_SECONDS),
+    "temperature_alerts": SeriesWindow(6 * HOUR, lambda start: query_influx_points(temperature_alerts_flux(start)),
+                                       LATE_DATA_SECONDS),
+    "latency": SeriesWindow(6 * HOUR, lambda start: query_influx_points(latency_flux(start)),
+                            LATE_DATA_SECONDS),
+}
+
+def request_max_points():
+    """Read the optional max_points= parameter, charts only need about one point per pixel"""
+    value = request.args.get("max_points")
+    if value is None:
+        return None
+    try:
+        max_points = int(value)
+    except ValueError:
+        max_points = 0
+    if max_points < 3:
+        abort(400, description="max_points must be an integer >= 3")
+    return max_points
+
+def window_response(name, newest_first=False):
+    """Refresh a series window and return its points, only the delta if since= is given,
+    LTTB-downsampled if max_points= is given"""
+    try:
+        since = parse_since(request.args.get("since"))
+    except ValueError:
+        abort(400, description="since must be RFC3339 or epoch seconds")
+    max_points = request_max_points()
+
+    window = WINDOWS[name]
+    window.refresh()
+    times, values = window.snapshot(since)
+    times, values = downsample(times, values, max_points)
+    if newest_first:
+        times = times[::-1]
+        values = values[::-1]
+
+    last = window.last_time
+    return {
+        "x": format_times(times),
+        "y": values_to_list(values),
+        "last": flux_time(last) if last is not None else None
+    }
+
+# Temperature endpoint
+@app.route('/temperature', methods=['GET'])
+@streamable(temperature_flux, "-1h")
+@cached("temperature")
+def temperature():
+    return window_response("temperature")
+
+
+# Pressure endpoint
+@app.route('/pressure', methods=['GET'])
+@streamable(pressure_flux, "-6h")
+@cached("pressure")
+def pressure():
+    return window_response("pressure")
+
+# Air density trend endpoint
+@app.route('/air_density', methods=['GET'])
+@streamable(air_density_flux, "-6h")
+@cached("air_density")
+def air_density():
+    return window_response("air_density")
+
+# Temperature alerts endpoint
+@app.route('/temperature_alerts', methods=['GET'])
+@streamable(lambda start: temperature_alerts_flux(start, newest_first=True), "-6h")
+@cached("temperature_alerts")
+def temperature_alerts():
+    return window_response("temperature_alerts", newest_first=True)
+
+# ML Predictions and current temperature endpoint
+@app.route('/ml_predictions', methods=['GET'])
+@streamable(ml_predictions_flux, "-6h")
+@cached("ml_predictions")
+def ml_predictions():
+    flux_query = ml_predictions_flux("-6h")
     x, y = query_influx(flux_query)
-    return jsonify({"x": x, "y": y})
+    return {"x": x, "y": y}
 
 # Latency endpoint
 @app.route('/latency', methods=['GET'])
+@streamable(latency_flux, "-6h")
+@cached("latency")
 def latency():
-    flux_query = f'''
-    from(bucket:"{BUCKET}")
-      |> range(start: -6h)
-      |> filter(fn: (r) => r._field == "latency_ms")
-    '''
-    x, y = query_influx(flux_query)
-    return jsonify({"x": x, "y": y})
+    return window_response("latency")
 
 # Temperature count per minute endpoint
 @app.route('/temperature_count', methods=['GET'])
+@streamable(temperature_count_flux, "-6h")
+@cached("temperature_count")
 def temperature_count():
-    flux_query = f'''
-    from(bucket:"{BUCKET}")
-      |> range(start: -6h)
-      |> filter(fn: (r) => r._measurement == "weather" and r._field == "temperature")
-      |> aggregateWindow(every: 1m, fn: count)
-    '''
-    x, y = query_influx(flux_query)
-    return jsonify({"x": x, "y": y})
+    flux_query = temperature_count_flux("-6h")
+    times, values = downsample(*query_influx_points(flux_query), request_max_points())
+    return {"x": format_times(times), "y": values_to_list(values)}
+
+# Comfort model shared with the firmware (comfort_HVAC.ComfortML), scored in bulk
+scorer = ComfortScorer()
+# Precomputed probability surface for every age class x sex x temperature
+surface = load_surface()
+
+# Registry written by the Pico (copy or mount users_reg.json and its .log next to the API),
+# reloaded when the files change
+user_registry.USER_FILE = os.getenv("USER_REGISTRY_FILE", user_registry.USER_FILE)
+
+RELATIVE_START = re.compile(r"^-\d+[smhd]$")
+
+def request_start(default):
+    """Read the optional start= parameter (relative like -6h, RFC3339 or epoch seconds) as a Flux time"""
+    value = request.args.get("start")
+    if not value:
+        return default
+    if RELATIVE_START.match(value):
+        return value
+    try:
+        return flux_time(parse_since(value))
+    except ValueError:
+        abort(400, description="start must be a relative duration (-6h), RFC3339 or epoch seconds")
+
+# Comfort probability per registered user endpoint
+@app.route('/comfort', methods=['GET'])
+@cached("comfort")
+def comfort():
+    start = request_start("-6h")
+    times, values = query_influx_points(temperature_flux(start))
+    times, values = downsample(times, numeric_values(values), request_max_points())
+
+    users = user_registry.load_users()
+    names, probabilities = scorer.score_users(users, values)
+    return {
+        "x": format_times(times),
+        "temperature": values_to_list(values),
+        "threshold": scorer.threshold,
+        "model_version": scorer.version,
+        "users": {
+            name: {
+                "age": users[name]["age"],
+                "sex": users[name]["sex"],
+                "probability": values_to_list(probabilities[i].round(4)),
+            }
+            for i, name in enumerate(names)
+        }
+    }
+
+def request_index(name, size):
+    """Read an optional integer parameter in range(size), None if absent"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        index = int(value)
+    except ValueError:
+        index = -1
+    if not 0 <= index < size:
+        abort(400, description=f"{name} must be an integer from 0 to {size - 1}")
+    return index
+
+# Comfort curves endpoint, optionally one age class (age=) and/or sex (sex=)
+@app.route('/comfort_curve', methods=['GET'])
+def comfort_curve():
+    if surface is None:
+        abort(404, description="comfort_curve.npz not found, run HVAC/train_model.py")
+    probability = surface["probability"]
+    n_age, n_sex, _ = probability.shape
+    age = request_index("age", n_age)
+    sex = request_index("sex", n_sex)
+
+    return jsonify({
+        "version": surface["version"],
+        "threshold": surface["threshold"],
+        "temperature": values_to_list(surface["temperature"].round(1)),
+        "curves": {
+            f"a{a}s{s}": values_to_list(probability[a, s].round(4))
+            for a in range(n_age) if age in (None, a)
+            for s in range(n_sex) if sex in (None, s)
+        }
+    })
+
+# Cache statistics endpoint
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(cache.get_stats())
 
 # Root route
 @app.route('/')
 def home():
-    return "Flask API running. Endpoints: /temperature, /pressure, /air_density, /temperature_alerts, /ml_predictions, /latency, /temperature_count"
+    return "Flask API running. Endpoints: /temperature, /pressure, /air_density, /temperature_alerts, /ml_predictions, /latency, /temperature_count, /comfort, /comfort_curve, /cache_stats"
 
 # Run server
 if __name__ == '__main__':
@@ -0,0 +1,456 @@
+"""
+COOPERATIVE RUNTIME FOR THE PICO FIRMWARE
+Sampling, publishing, control messages, LED feedback and Wi-Fi supervision
+run as separate uasyncio tasks instead of one blocking loop (see main.py).
+
+umqtt calls are still blocking socket operations, but they only run inside
+the publish, control and supervisor tasks. Samples are taken by the
+TimerSampler timer callback, so their cadence holds while a task waits on the
+network. Every hardware object is passed in, which lets the runtime run on
+CPython with stub machine/network modules.
+"""
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+import time
+
+# Prediction horizons in minutes, published as weather/predictions/<n>min
+PREDICTION_HORIZONS = (5, 15, 30)
+
+
+class Runtime:
+    """Cooperative tasks sharing the sensor, MQTT, Wi-Fi and LED objects."""
+    def __init__(self, config, sampler, mqtt, wifi, led, ml,
+                 offline=None, scenario_name="normal", time_sync=None):
+        # config: module (or object) with the config_template.py settings
+        # sampler: TimerSampler, or anything with read()/timestamp/__len__
+        # offline: optional OfflineBuffer used while MQTT is down
+        # time_sync: optional callable run once after the first Wi-Fi connection
+        self.config = config
+        self.sampler = sampler
+        self.mqtt = mqtt
+        self.wifi = wifi
+        self.led = led
+        self.ml = ml
+        self.offline = offline
+        self.scenario_name = scenario_name
+        self.time_sync = time_sync
+
+        self.running = False
+        self.online = False
+        self.tasks = []
+
+        # readings waiting for the publish task: (timestamp, temp, pres)
+        self.pending = []
+        self.max_pending = 32
+        self._ready = asyncio.Event()
+
+        self.reading_count = 0
+        self.msg_id = 0
+
+        # LED state requested by the other tasks, applied by the LED task
+        self.led_mode = None
+        self._led_shown = None
+        self._pulses = 0
+
+        # intervals (seconds)
+        self.poll_interval = 0.05
+        self.control_interval = 0.2
+        self.wifi_check_interval = 2
+        self._last_mqtt_attempt = None
+
+    def request_pulse(self, count=1):
+        """Ask the LED task for count short pulses."""
+        self._pulses += count
+
+    # Tasks
+
+    async def sampling_task(self):
+        """Move timer samples to the publish queue and set the comfort LED."""
+        while self.running:
+            while len(self.sampler):
+                temp, pres = self.sampler.read()
+                if temp is None:
+                    break
+
+                if len(self.pending) >= self.max_pending:
+                    # publisher is stuck, keep the newest readings
+                    self.pending.pop(0)
+                self.pending.append((self.sampler.timestamp, temp, pres))
+                self._ready.set()
+
+                if temp > 25:
+                    self.led_mode = "ALERT"
+                elif temp < 18:
+                    self.led_mode = "UNCOMFORTABLE"
+                else:
+                    self.led_mode = "COMFORTABLE"
+            await asyncio.sleep(self.poll_interval)
+
+    async def publish_task(self):
+        """Publish queued readings and predictions, buffer them while offline."""
+        while self.running:
+            await self._ready.wait()
+            self._ready.clear()
+
+            while self.pending:
+                self._publish_reading(*self.pending.pop(0))
+                # let sampling and LED tasks run between readings
+                await asyncio.sleep(0)
+
+            if self.online:
+                self.online = self.mqtt.flush()
+
+    async def control_task(self):
+        """Poll for control messages while connected."""
+        last = None
+        while self.running:
+            if self.online:
+                self.mqtt.check_messages()
+                if self.mqtt.last_message is not last:
+                    last = self.mqtt.last_message
+                    self.request_pulse(2)
+            await asyncio.sleep(self.control_interval)
+
+    async def led_task(self):
+        """Apply the requested LED mode and pulses, the LED engine animates them in the background."""
+        while self.running:
+            if self._pulses:
+                # base mode comes back after the pulses
+                self.led.pulse(self._pulses)
+                self._pulses = 0
+            if self.led_mode is not None and self.led_mode != self._led_shown:
+                self.led.set_mode(self.led_mode)
+                self._led_shown = self.led_mode
+            await asyncio.sleep(self.poll_interval)
+
+    async def wifi_task(self):
+        """Keep Wi-Fi up and reconnect MQTT, without blocking the other tasks while waiting."""
+        synced = False
+        while self.running:
+            if not self.wifi.is_connected():
+                self.online = False
+                self.led_mode = "WIFI_CONNECTING"
+                if await self._wifi_connect(self.config.WIFI_TIMEOUT):
+                    self.led_mode = "WIFI_CONNECTED"
+                else:
+                    self.led_mode = "WIFI_ERROR"
+
+            if self.wifi.is_connected():
+                if not synced and self.time_sync is not None:
+                    self.time_sync()
+                    synced = True
+
+                if not self.online and self._mqtt_attempt_due():
+                    self._last_mqtt_attempt = time.time()
+                    # a successful connect replays the offline buffer
+                    self.online = self.mqtt.connect()
+                    if self.online:
+                        self.mqtt.subscribe(self.config.TOPIC_CONTROL)
+                    elif self.offline is not None:
+                        print(f"MQTT unavailable ({len(self.offline)} readings buffered)")
+
+            await asyncio.sleep(self.wifi_check_interval)
+
+    # Helpers
+
+    async def _wifi_connect(self, timeout):
+        """Non-blocking version of WiFiManager.connect."""
+        wlan = self.wifi.wlan
+        wlan.active(True)
+        if not wlan.isconnected():
+            print(f"Connecting to {self.wifi.ssid}...")
+            wlan.connect(self.wifi.ssid, self.wifi.password)
+            start = time.time()
+            while not wlan.isconnected():
+                if time.time() - start > timeout:
+                    print(f"Wi-Fi timeout after {timeout} seconds")
+                    return False
+                await asyncio.sleep(0.5)
+        print(f"Wi-Fi connected: {self.wifi.get_ip()}")
+        return True
+
+    def _mqtt_attempt_due(self):
+        if self._last_mqtt_attempt is None:
+            return True
+        return time.time() - self._last_mqtt_attempt >= self.config.RECONNECT_INTERVAL
+
+    def _publish_reading(self, timestamp, temp, pres):
+        self.reading_count += 1
+        self.ml.add_reading(temp)
+
+        self.msg_id += 1
+        payload = {
+            "id": self.msg_id,
+            "temperature": temp,
+            "timestamp": timestamp,
+            "scenario": self.scenario_name
+        }
+
+        reading = (self.msg_id, timestamp, temp, pres)
+        if self.online:
+            pressure = {"timestamp": timestamp, "pressure": pres}
+            # topics that were not sent go to the offline buffer, never twice
+            self.online = self.mqtt.send_reading(payload, pressure, reading)
+        elif self.offline is not None:
+            # Store-and-forward, keeps the sample timestamp
+            self.offline.append(*reading)
+
+        # Predictions every 6 readings (30 seconds at 5s interval)
+        if self.online and self.reading_count % 6 == 0:
+            batch = self.ml.predict_horizons(PREDICTION_HORIZONS)
+            for timeframe, prediction in self.ml.expand_horizons(batch):
+                self.mqtt.publish(f"weather/predictions/{timeframe}", prediction)
+            print(f"Prediction (5min): {batch['predictions']['5min']}°C, trend {batch['trend']}")
+
+    async def run(self, duration_seconds=None):
+        """Run every task until duration_seconds elapses (forever if None)."""
+        self.running = True
+        self.tasks = tasks = [asyncio.create_task(task()) for task in (
+            self.wifi_task,
+            self.sampling_task,
+            self.publish_task,
+            self.control_task,
+            self.led_task,
+        )]
+        try:
+            if duration_seconds is None:
+                while self.running:
+                    await asyncio.sleep(1)
+            else:
+                await asyncio.sleep(duration_seconds)
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+
+
+def main(duration_seconds=None, scenario_name="normal"):
+    """Build the hardware objects from config and run the cooperative runtime."""
+    import ntptime
+    import config
+    from wifi_manager import WiFiManager
+    from mqtt_client import MQTTManager
+    from sensor_manager import WeatherSensor, TimerSampler
+    from ml_predictor import MLPredictor
+    from led_manager import LEDManager
+    from offline_buffer import OfflineBuffer
+
+    print("=" * 60)
+    print("ASYNC RUNTIME")
+    print("=" * 60)
+
+    led = LEDManager()
+    led.set_status_patterns(config.LED_PATTERNS)
+
+    sensor = WeatherSensor()
+    if not sensor.is_connected():
+        print("Sensor not found")
+        return
+
+    wifi = WiFiManager(config.WIFI_SSID, config.WIFI_PASSWORD)
+    mqtt = MQTTManager(
+        config.MQTT_BROKER,
+        config.MQTT_PORT,
+        config.MQTT_USERNAME,
+        config.MQTT_PASSWORD,
+        "pico-ml-async",
+        queue_size=config.MQTT_QUEUE_SIZE,
+        flush_size=config.MQTT_FLUSH_SIZE,
+        flush_age_ms=config.MQTT_FLUSH_AGE_MS
+    )
+    offline = OfflineBuffer(
+        config.OFFLINE_BUFFER_FILE,
+        capacity=config.OFFLINE_BUFFER_CAPACITY,
+        batch_size=config.OFFLINE_REPLAY_BATCH
+    )
+    mqtt.attach_offline_buffer(offline, config.TOPIC_TEMPERATURE, config.TOPIC_PRESSURE, scenario_name)
+
+    def sync_time():
+        try:
+            ntptime.host = "pool.ntp.org"
+            ntptime.settime()
+            print("Time synchronized")
+        except Exception as e:
+            print("NTP sync failed:", e)
+
+    sampler = TimerSampler(sensor, config.PUBLISH_INTERVAL,
+                           config.SENSOR_NOISE_TARGET_PA, config.SENSOR_MAX_LAG,
+                           capacity=config.SAMPLE_BUFFER_SIZE)
+    ml = MLPredictor(reading_interval=config.PUBLISH_INTERVAL)
+    runtime = Runtime(config, sampler, mqtt, wifi, led, ml,
+                      offline=offline, scenario_name=scenario_name, time_sync=sync_time)
+
+    try:
+        asyncio.run(runtime.run(duration_seconds))
+    except KeyboardInterrupt:
+        print("\n\nStopped by user")
+    finally:
+        print("\nCleaning up...")
+        sampler.stop()
+        led.solid_off()
+        mqtt.disconnect()
+        wifi.disconnect()
+
+
+def test_runtime(readings=10):
+    """Run the tasks against fake sampler, Wi-Fi, MQTT, LED and offline buffer objects.
+    The broker drops halfway: every reading must end up either published or
+    buffered, once and with its sample timestamp, and run() must cancel
+    every task. Needs no hardware, runs on CPython and on the Pico."""
+    from ml_predictor import MLPredictor
+
+    class Config:
+        WIFI_TIMEOUT = 2
+        RECONNECT_INTERVAL = 60
+        TOPIC_CONTROL = "weather/control"
+        TOPIC_TEMPERATURE = "weather/temperature"
+        TOPIC_PRESSURE = "weather/pressure"
+
+    class Sampler:
+        def __init__(self):
+            self.samples = []
+            self.timestamp = None
+
+        def __len__(self):
+            return len(self.samples)
+
+        def read(self):
+            self.timestamp, temp, pres = self.samples.pop(0)
+            return temp, pres
+
+    class WLAN:
+        def __init__(self):
+            self.polls = 0
+            self.connecting = False
+
+        def active(self, on):
+            pass
+
+        def connect(self, ssid, password):
+            self.connecting = True
+
+        def isconnected(self):
+            # connects on the second poll, _wifi_connect has to await in between
+            if self.connecting:
+                self.polls += 1
+            return self.polls >= 2
+
+    class WiFi:
+        ssid = "test"
+        password = ""
+
+        def __init__(self):
+            self.wlan = WLAN()
+
+        def is_connected(self):
+            return self.wlan.isconnected()
+
+        def get_ip(self):
+            return "0.0.0.0"
+
+    class MQTT:
+        def __init__(self, drop_after, offline):
+            self.sent = []
+            self.predictions = []
+            self.drop_after = drop_after
+            self.offline = offline
+            self.last_message = None
+            self.checked = 0
+
+        def connect(self):
+            return len(self.sent) < self.drop_after
+
+        def subscribe(self, topic):
+            pass
+
+        def send_reading(self, temperature, pressure, reading):
+            if len(self.sent) >= self.drop_after:
+                self.offline.append(*reading)
+                return False
+            self.sent.append((Config.TOPIC_TEMPERATURE, temperature))
+            self.sent.append((Config.TOPIC_PRESSURE, pressure))
+            return True
+
+        def publish(self, topic, message):
+            self.predictions.append(topic)
+            return True
+
+        def flush(self):
+            return len(self.sent) < self.drop_after
+
+        def check_messages(self):
+            self.checked += 1
+            if self.checked == 2:
+                self.last_message = ("weather/control", "BLINK")
+
+    class LED:
+        def __init__(self):
+            self.modes = []
+            self.pulses = 0
+
+        def set_mode(self, mode):
+            self.modes.append(mode)
+
+        def pulse(self, count):
+            self.pulses += count
+
+    class Offline:
+        def __init__(self):
+            self.records = []
+
+        def __len__(self):
+            return len(self.records)
+
+        def append(self, msg_id, timestamp, temp, pres):
+            self.records.append((timestamp, temp))
+
+    sampler = Sampler()
+    offline = Offline()
+    # temperature + pressure message per reading, drop after half of the readings
+    mqtt = MQTT(readings // 2 * 2, offline)
+    led = LED()
+    runtime = Runtime(Config, sampler, mqtt, WiFi(), led, MLPredictor(reading_interval=1), offline=offline)
+    runtime.wifi_check_interval = 0.1
+
+    async def produce():
+        while not runtime.online:
+            await asyncio.sleep(0.05)
+        for i in range(readings):
+            sampler.samples.append((1000 + i, 20.0 + i / 10, 100000.0))
+            await asyncio.sleep(0.1)
+
+    async def scenario():
+        asyncio.create_task(produce())
+        await runtime.run(readings * 0.1 + 1.5)
+        # cancelled tasks finish at their next scheduling point
+        await asyncio.sleep(0.1)
+        return all(task.done() for task in runtime.tasks)
+
+    stopped = asyncio.run(scenario())
+
+    published = [(m["timestamp"], m["temperature"]) for topic, m in mqtt.sent
+                 if topic == Config.TOPIC_TEMPERATURE]
+    delivered = published + offline.records
+    expected = [(1000 + i, 20.0 + i / 10) for i in range(readings)]
+
+    checks = {
+        "every reading published or buffered once, with its timestamp": delivered == expected,
+        "broker drop reached the offline buffer": len(offline.records) > 0 and len(published) > 0,
+        "Wi-Fi LED state": led.modes[0] == "WIFI_CONNECTING",
+        "comfort LED set from readings": "COMFORTABLE" in led.modes,
+        "control message pulses the LED": led.pulses == 2,
+        "run() cancels every task": stopped and not runtime.running,
+    }
+    for name, ok in checks.items():
+        print(f"  {'OK' if ok else 'FAILED'}: {name}")
+    ok = all(checks.values())
+    print(f"Async runtime: {'OK' if ok else 'FAILED'} ({len(published)} published, {len(offline)} buffered)")
+    return ok
+
+
+if __name__ == "__main__":
+    main()
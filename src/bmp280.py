@@ -1,5 +1,8 @@
+import micropython
 from micropython import const
+from uarray import array
 from ustruct import unpack as unp
+from utime import ticks_ms, ticks_diff
 
 # Author David Stenwall (david at stenwall.io)
 
@@ -85,12 +88,121 @@ _BMP280_REGISTER_CONFIG = const(0xF5)  # IIR filter config
 _BMP280_REGISTER_DATA = const(0xF7)
 
 
+@micropython.native
+def _compensate_p_int32(adc_p, t_fine, cal):
+    # Datasheet 32-bit integer pressure formula (section 8.2), returns Pa.
+    # cal is array('i') with P1..P9. The result equals the datasheet routine
+    # (_p_int32_reference), but every intermediate stays a MicroPython small
+    # int (|x| < 2**30) for any calibration and t_fine of -40..85 C, as long
+    # as the datasheet formula itself holds (var1 > 0, 0 <= p * 3125 < 2**32)
+    # and p stays below 2**20 Pa, so no long int is allocated. Products that could reach
+    # 31 bits are split as a * b = (a * (b >> n) << n) + a * (b & (2**n - 1))
+    # before their shift. Native rather than viper: viper has no integer floor
+    # division (and the RP2040 no hardware divide).
+    P1 = int(cal[0])
+    P2 = int(cal[1])
+    P3 = int(cal[2])
+    P4 = int(cal[3])
+    P5 = int(cal[4])
+    P6 = int(cal[5])
+    P7 = int(cal[6])
+    P8 = int(cal[7])
+    P9 = int(cal[8])
+
+    v = (t_fine >> 1) - 64000  # datasheet var1, |v| <= 166400
+    # sq = (v >> 2) ** 2 >> 11, with v >> 2 = h * 64 + l
+    h = (v >> 2) >> 6
+    l = (v >> 2) & 63
+    sq = h * h * 2 + ((h * l * 128 + l * l) >> 11)
+
+    # datasheet var2 >> 12 = ((sq * P6 + (v * P5 << 1)) >> 14) + (P4 << 4)
+    var2 = P6 * (sq >> 14) + P5 * (v >> 13) \
+        + ((P6 * (sq & 16383) + ((P5 * (v & 8191)) << 1)) >> 14) + (P4 << 4)
+
+    # datasheet var1 = ((P3 * (sq >> 2) >> 3) + (P2 * v >> 1)) >> 18
+    #                = (P3 * (sq >> 2) + 4 * (P2 * v - (P2 * v & 1))) >> 21
+    sq = sq >> 2
+    var1 = P3 * (sq & 255) + ((P2 * (v & 63)) << 2) - ((P2 & v & 1) << 2)
+    var1 = (P3 * (sq >> 8) + P2 * (v >> 6) + (var1 >> 8)) >> 13
+    # ((32768 + var1) * P1) >> 15, 32768 * P1 is a multiple of 2**15
+    var1 = P1 + ((var1 * P1) >> 15)
+    if var1 == 0:
+        return 0
+
+    p = (1048576 - adc_p) - var2
+    # p * 3125 may exceed 31 bits: with p * 3125 = (q * var1 + r) * 125,
+    # floor(p * 3125 / var1) = q * 125 + r * 125 // var1
+    if p < 687195:
+        # p * 3125 < 0x80000000, datasheet computes (p * 3125 << 1) // var1
+        q = (p * 50) // var1
+        r = (p * 50) - q * var1
+        p = q * 125 + (r * 125) // var1
+    else:
+        # datasheet computes (p * 3125 // var1) * 2
+        q = (p * 25) // var1
+        r = (p * 25) - q * var1
+        p = (q * 125 + (r * 125) // var1) * 2
+
+    # datasheet var1 = (P9 * sq) >> 12 and var2 = ((p >> 2) * P8) >> 13,
+    # with sq = (p >> 3) ** 2 >> 13 and p >> 3 = h * 128 + l
+    h = p >> 10
+    l = (p >> 3) & 127
+    sq = h * h * 2 + ((h * l * 256 + l * l) >> 13)
+    var1 = P9 * (sq >> 12) + ((P9 * (sq & 4095)) >> 12)
+    var2 = P8 * (p >> 15) + ((P8 * ((p >> 2) & 8191)) >> 13)
+    return p + ((var1 + var2 + P7) >> 4)
+
+
+def _p_int32_reference(adc_p, t_fine, cal):
+    # Datasheet 32-bit pressure formula as written in C (long ints here),
+    # returns (Pa, True when the p >= 0x80000000 division branch is taken)
+    P1, P2, P3, P4, P5, P6, P7, P8, P9 = cal
+    var1 = (t_fine >> 1) - 64000
+    var2 = (((var1 >> 2) * (var1 >> 2)) >> 11) * P6
+    var2 = var2 + ((var1 * P5) << 1)
+    var2 = (var2 >> 2) + (P4 << 16)
+    var1 = (((P3 * (((var1 >> 2) * (var1 >> 2)) >> 13)) >> 3) + ((P2 * var1) >> 1)) >> 18
+    var1 = ((32768 + var1) * P1) >> 15
+    if var1 == 0:
+        return 0, False
+    p = (((1048576 - adc_p) - (var2 >> 12)) * 3125) & 0xFFFFFFFF
+    high = p >= 0x80000000
+    if high:
+        p = (p // var1) * 2
+    else:
+        p = (p << 1) // var1
+    var1 = (P9 * (((p >> 3) * (p >> 3)) >> 13)) >> 12
+    var2 = ((p >> 2) * P8) >> 13
+    return p + ((var1 + var2 + P7) >> 4), high
+
+
 class BMP280:
     def __init__(self, i2c_bus, addr=0x76, use_case=BMP280_CASE_HANDHELD_DYN):
         self._bmp_i2c = i2c_bus
         self._i2c_addr = addr
 
         # read calibration data
+        self._load_calibration()
+
+        # output raw
+        self._t_raw = 0
+        self._t_fine = 0
+        self._t = 0
+
+        self._p_raw = 0
+        self._p = 0
+
+        self.read_wait_ms = 0  # interval between forced measure and readout
+        self._new_read_ms = 200  # min interval between two bus reads, older data is refetched
+        self._last_read_ts = None
+
+        # preallocated burst buffer for the data registers
+        self._data = bytearray(6)
+
+        if use_case is not None:
+            self.use_case(use_case)
+
+    def _load_calibration(self):
         # < little-endian
         # H unsigned short
         # h signed short
@@ -106,21 +218,12 @@ class BMP280:
         self._P7 = unp('<h', self._read(0x9A, 2))[0]
         self._P8 = unp('<h', self._read(0x9C, 2))[0]
         self._P9 = unp('<h', self._read(0x9E, 2))[0]
+        self._pack_calibration()
 
-        # output raw
-        self._t_raw = 0
-        self._t_fine = 0
-        self._t = 0
-
-        self._p_raw = 0
-        self._p = 0
-
-        self.read_wait_ms = 0  # interval between forced measure and readout
-        self._new_read_ms = 200  # interval between
-        self._last_read_ts = 0
-
-        if use_case is not None:
-            self.use_case(use_case)
+    def _pack_calibration(self):
+        # pressure coefficients for the 32-bit routine
+        self._p_cal = array('i', (self._P1, self._P2, self._P3, self._P4, self._P5,
+                                  self._P6, self._P7, self._P8, self._P9))
 
     def _read(self, addr, size=1):
         return self._bmp_i2c.readfrom_mem(self._i2c_addr, addr, size)
@@ -130,10 +233,17 @@ class BMP280:
             b_arr = bytearray([b_arr])
         return self._bmp_i2c.writeto_mem(self._i2c_addr, addr, b_arr)
 
-    def _gauge(self):
-        # TODO limit new reads
+    def _gauge(self, force=False):
+        # reuse the last burst while it is fresh
+        now = ticks_ms()
+        if (not force and self._last_read_ts is not None
+                and ticks_diff(now, self._last_read_ts) < self._new_read_ms):
+            return
+        self._last_read_ts = now
+
         # read all data at once (as by spec)
-        d = self._read(_BMP280_REGISTER_DATA, 6)
+        d = self._data
+        self._bmp_i2c.readfrom_mem_into(self._i2c_addr, _BMP280_REGISTER_DATA, d)
 
         self._p_raw = (d[0] << 12) + (d[1] << 4) + (d[2] >> 4)
         self._t_raw = (d[3] << 12) + (d[4] << 4) + (d[5] >> 4)
@@ -158,6 +268,7 @@ class BMP280:
         self._P7 = 15500
         self._P8 = -14600
         self._P9 = 6000
+        self._pack_calibration()
 
     def load_test_data(self):
         self._t_raw = 519888
@@ -180,6 +291,9 @@ class BMP280:
     def _calc_t_fine(self):
         # From datasheet page 22
         self._gauge()
+        self._compute_t_fine()
+
+    def _compute_t_fine(self):
         if self._t_fine == 0:
             var1 = (((self._t_raw >> 3) - (self._T1 << 1)) * self._T2) >> 11
             var2 = (((((self._t_raw >> 4) - self._T1)
@@ -188,17 +302,13 @@ class BMP280:
                     * self._T3) >> 14
             self._t_fine = var1 + var2
 
-    @property
-    def temperature(self):
-        self._calc_t_fine()
+    def _compensate_temperature(self):
         if self._t == 0:
             self._t = ((self._t_fine * 5 + 128) >> 8) / 100.
         return self._t
 
-    @property
-    def pressure(self):
+    def _compensate_pressure(self):
         # From datasheet page 22
-        self._calc_t_fine()
         if self._p == 0:
             var1 = self._t_fine - 128000
             var2 = var1 * var1 * self._P6
@@ -219,6 +329,79 @@ class BMP280:
             self._p = p / 256.0
         return self._p
 
+    @property
+    def temperature(self):
+        self._calc_t_fine()
+        return self._compensate_temperature()
+
+    @property
+    def pressure(self):
+        self._calc_t_fine()
+        return self._compensate_pressure()
+
+    def read_compensated(self, force=False):
+        # temperature (C) and pressure (Pa) from a single data burst,
+        # t_fine is computed once and shared by both. force skips the
+        # freshness cache (e.g. right after a forced measurement)
+        self._gauge(force)
+        self._compute_t_fine()
+        return self._compensate_temperature(), self._compensate_pressure()
+
+    def read_compensated_int(self, force=False):
+        # temperature (0.01 C) and pressure (Pa) as small ints from a single
+        # data burst, no float or long int is allocated
+        self._gauge(force)
+        self._compute_t_fine()
+        return (self._t_fine * 5 + 128) >> 8, _compensate_p_int32(self._p_raw, self._t_fine, self._p_cal)
+
+    def verify_int32(self, tolerance=8):
+        # check the 32-bit routine with the datasheet calibration: t_fine and
+        # temperature must match the existing path exactly on the datasheet
+        # example, and over a sweep of t_fine (-40..85 C) and adc_p the
+        # pressure must equal the datasheet C formula (_p_int32_reference)
+        # and stay within tolerance Pa of the 64-bit _compensate_pressure.
+        # The 32-bit formula keeps fewer fraction bits, it is 5.3 Pa off at
+        # most over the sweep; 8 Pa is below the sensor's 12 Pa relative
+        # accuracy. The sweep goes up to 125 kPa so that both division
+        # branches are covered (p >= 0x80000000 / 3125 starts around 117 kPa).
+        # The chip calibration is reloaded afterwards
+        self.load_test_calibration()
+        self.load_test_data()
+        self._t_fine = 0
+        self._t = 0
+        self._p = 0
+        self._compute_t_fine()
+        t = self._compensate_temperature()
+        t_int = (self._t_fine * 5 + 128) >> 8
+        ok = self._t_fine == 128422 and t_int == 2508 and t == t_int / 100. \
+            and _compensate_p_int32(self._p_raw, self._t_fine, self._p_cal) == 100656
+
+        worst = 0
+        branches = [0, 0]
+        for t_fine in range(-204800, 435201, 32000):
+            for adc_p in range(150000, 700001, 10000):
+                self._t_fine = t_fine
+                self._p_raw = adc_p
+                self._p = 0
+                p64 = self._compensate_pressure()
+                if not 30000 <= p64 <= 125000:
+                    continue
+                p_ref, high = _p_int32_reference(adc_p, t_fine, self._p_cal)
+                p32 = _compensate_p_int32(adc_p, t_fine, self._p_cal)
+                branches[high] += 1
+                worst = max(worst, abs(p32 - p64))
+                ok = ok and p32 == p_ref and abs(p32 - p64) <= tolerance
+        ok = ok and branches[0] > 0 and branches[1] > 0
+        print("t_fine 128422 T {} C, pressure sweep {}+{} points, max {:.2f} Pa off the 64-bit routine: {}".format(
+            t, branches[0], branches[1], worst, "OK" if ok else "MISMATCH"))
+
+        self._load_calibration()
+        self._last_read_ts = None
+        self._t_fine = 0
+        self._t = 0
+        self._p = 0
+        return ok
+
     def _write_bits(self, address, value, length, shift=0):
         d = self._read(address)[0]
         m = int('1' * length, 2) << shift
@@ -319,4 +502,5 @@ class BMP280:
     def oversample(self, oss):
         assert 0 <= oss <= 4
         p_os, t_os, self.read_wait_ms = _BMP280_OS_MATRIX[oss]
-        self._write_bits(_BMP280_REGISTER_CONTROL, p_os + (t_os << 3), 2)
\ No newline at end of file
+        # osrs_p (bits 2-4) and osrs_t (bits 5-7), power mode is kept
+        self._write_bits(_BMP280_REGISTER_CONTROL, p_os + (t_os << 3), 6, 2)
\ No newline at end of file
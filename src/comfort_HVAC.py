@@ -1,26 +1,329 @@
+import json
 import math
 
+# Written by HVAC/train_model.py, upload it next to this file
+PARAMS_FILE = "comfort_params.json"
+PARAMS_FORMAT = 1
+# Comfort probability surface written by train_model.py with the same params version
+CURVE_FILE = "comfort_curve.csv"
+
+
 class ComfortML:
     """Predicts thermal comfort (0 or 1) based on age, sex, and temperature using logistic regression."""
-    def __init__(self):
-        # Training parameters
+    def __init__(self, params_file=PARAMS_FILE):
+        # Training parameters, used when params_file is missing or invalid
         self.weights = [0.060531, 0.02913246, -0.2601366 ]   # age, sex, temperature
         self.bias = 0.5626224060032154
 
         self.mean = [0.81778274, 0.59784226, 25.36569196]
         self.scale = [0.85941693, 0.49033345, 4.31082637]
 
+        # probability at or above which the user is comfortable
+        self.threshold = 0.6
+        self.version = "builtin"
+
+        if params_file is not None:
+            self.load_params(params_file)
+        self.build_table()
+
+    def load_params(self, path):
+        """Load weights, bias, mean, scale and threshold exported by train_model.py.
+        Returns False and keeps the current parameters if the file is missing or invalid."""
+        try:
+            with open(path) as f:
+                params = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if params.get("format") != PARAMS_FORMAT:
+            print(f"Comfort params: unsupported format in {path}, using built-in model")
+            return False
+        try:
+            weights = [float(w) for w in params["weights"]]
+            bias = float(params["bias"])
+            mean = [float(m) for m in params["mean"]]
+            scale = [float(s) for s in params["scale"]]
+            threshold = float(params["threshold"])
+        except (KeyError, TypeError, ValueError):
+            print(f"Comfort params: invalid {path}, using built-in model")
+            return False
+        if len(weights) != 3 or len(mean) != 3 or len(scale) != 3 or 0 in scale or not 0 < threshold < 1:
+            print(f"Comfort params: invalid {path}, using built-in model")
+            return False
+
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        self.threshold = threshold
+        self.version = params.get("version", "unknown")
+        return True
+
     def _normalize(self, x):
         return [(x[i] - self.mean[i]) / self.scale[i] for i in range(3)]
 
     def _sigmoid(self, z):
         return 1 / (1 + math.exp(-z))
 
+    def _user_term(self, age, sex):
+        # age and sex part of the weighted sum, in the order predict() adds it
+        return (self.weights[0] * ((age - self.mean[0]) / self.scale[0])
+                + self.weights[1] * ((sex - self.mean[1]) / self.scale[1]))
+
+    def build_table(self):
+        """Turn the model into one switch temperature per (age class, sex).
+        The probability is monotonic in temperature, so for readings in tenths
+        of a degree the label is below_label under the switch and the other one
+        from it on. Switches are solved analytically, then moved until they
+        agree with predict() on both sides."""
+        w = self.weights[2]
+        self.below_label = 1 if w < 0 else 0
+        self._limits = [0] * 8  # index = age * 2 + sex, in tenths of °C
+
+        logit = math.log(self.threshold / (1 - self.threshold))
+        for age in range(4):
+            for sex in range(2):
+                if w == 0:
+                    # temperature has no effect, the label is constant
+                    label = self.predict(age, sex, 0)[0]
+                    self._limits[age * 2 + sex] = 32767 if label == self.below_label else -32768
+                    continue
+
+                t = self.mean[2] + self.scale[2] * (logit - self.bias - self._user_term(age, sex)) / w
+                limit = int(math.floor(t * 10))
+                while self.predict(age, sex, (limit - 1) / 10)[0] != self.below_label:
+                    limit -= 1
+                while self.predict(age, sex, limit / 10)[0] == self.below_label:
+                    limit += 1
+                self._limits[age * 2 + sex] = limit
+
+    def load_curve(self, path=CURVE_FILE):
+        """Build the switch table from the exported comfort curve instead of solving it.
+        The curve must carry the loaded params version, readings outside its
+        temperature range take the label of the nearest end. Returns False and
+        keeps the current table if the file is missing, stale or invalid."""
+        try:
+            f = open(path)
+        except OSError:
+            return False
+
+        with f:
+            meta = f.readline()
+            if "version=%s " % self.version not in meta:
+                print(f"Comfort curve: {path} does not match params version {self.version}")
+                return False
+            f.readline()  # column names
+
+            limits = [None] * 8
+            first = True
+            try:
+                for line in f:
+                    fields = line.split(",")
+                    tenths = int(round(float(fields[0]) * 10))
+                    for i in range(8):
+                        if limits[i] is not None:
+                            continue
+                        label = 1 if float(fields[i + 1]) >= self.threshold else 0
+                        if label != self.below_label:
+                            limits[i] = -32768 if first else tenths
+                    first = False
+            except (ValueError, IndexError):
+                print(f"Comfort curve: invalid {path}")
+                return False
+
+        self._limits = [32767 if limit is None else limit for limit in limits]
+        return True
+
+    def predict_label(self, age, sex, temperature):
+        """Comfort label from the table, temperature is rounded to 0.1 °C."""
+        if round(temperature * 10) < self._limits[age * 2 + sex]:
+            return self.below_label
+        return 1 - self.below_label
+
+    def verify_table(self, t_min=0.0, t_max=40.0):
+        """Check the table against predict() for every age class, sex and 0.1 °C step in range."""
+        mismatches = 0
+        checked = 0
+        for age in range(4):
+            for sex in range(2):
+                for i in range(int(round(t_min * 10)), int(round(t_max * 10)) + 1):
+                    t = i / 10
+                    checked += 1
+                    if self.predict_label(age, sex, t) != self.predict(age, sex, t)[0]:
+                        mismatches += 1
+                        print(f"Mismatch: age={age} sex={sex} T={t}")
+        print(f"Comfort table: {checked} points checked, {mismatches} mismatches")
+        return mismatches == 0
+
     def predict(self, age, sex, temperature):
         x = self._normalize([age, sex, temperature])
 
         z = sum(w * xi for w, xi in zip(self.weights, x)) + self.bias
         prob = self._sigmoid(z)
 
-        label = 1 if prob >= 0.6 else 0
+        label = 1 if prob >= self.threshold else 0
         return label, prob
+
+
+class ComfortEvaluator:
+    """Comfort prediction for one user, set up once per session.
+
+    Labels come from the model's switch table, so a reading costs one
+    comparison. The probability (with the user's age and sex terms computed
+    once) is recomputed whenever the temperature changes, repeated readings
+    cost nothing. The HVAC LEDs are only switched when the label changes.
+    """
+    def __init__(self, age, sex, model=None, leds=None):
+        self.model = model if model is not None else ComfortML()
+        self.leds = leds
+        self.age = age
+        self.sex = sex
+        self._z_user = self.model._user_term(age, sex)
+
+        self.temperature = None
+        self.label = None
+        self.prob = None
+
+    def probability(self, temperature):
+        """Comfort probability, same value as ComfortML.predict."""
+        m = self.model
+        x = (temperature - m.mean[2]) / m.scale[2]
+        return m._sigmoid(self._z_user + m.weights[2] * x + m.bias)
+
+    def evaluate(self, temperature):
+        """Return (label, prob, changed) for this temperature, changed is True when the
+        label differs from the last one."""
+        if temperature == self.temperature:
+            return self.label, self.prob, False
+        self.temperature = temperature
+        self.prob = self.probability(temperature)
+
+        label = self.model.predict_label(self.age, self.sex, temperature)
+        changed = label != self.label
+        if changed:
+            self.label = label
+            if self.leds is not None:
+                self.leds.set_mode_hvac("COMFORTABLE" if label == 1 else "UNCOMFORTABLE")
+        return label, self.prob, changed
+
+
+class GroupComfortEvaluator:
+    """Comfort of every occupant of a room, evaluated once per reading.
+
+    Occupants with the same age class and sex share a switch temperature, so
+    a reading costs one table comparison per (age class, sex) group, at most
+    8, however many occupants there are. Per-user labels are only rebuilt when
+    a group label changes.
+    """
+    def __init__(self, users, model=None, leds=None, majority=0.5):
+        # users: dict username -> {"age": age_class, "sex": sex}, as in the registry
+        self.model = model if model is not None else ComfortML()
+        self.leds = leds
+        # fraction of comfortable occupants at or above which the HVAC LEDs show comfortable
+        self.majority = majority
+
+        self.names = sorted(users)
+        groups = {}
+        for name in self.names:
+            user = users[name]
+            groups.setdefault(user["age"] * 2 + user["sex"], []).append(name)
+        self._groups = list(groups.items())
+        self._group_labels = None
+
+        self.temperature = None
+        self.labels = {}
+        self.comfortable = 0
+        self.fraction = None
+
+    def evaluate(self, temperature):
+        """Return (fraction, labels, changed): fraction of comfortable occupants,
+        username -> label, and whether any label differs from the last reading."""
+        if temperature == self.temperature:
+            return self.fraction, self.labels, False
+        self.temperature = temperature
+
+        m = self.model
+        tenths = round(temperature * 10)
+        above = 1 - m.below_label
+        group_labels = [m.below_label if tenths < m._limits[key] else above for key, _ in self._groups]
+        if group_labels == self._group_labels:
+            return self.fraction, self.labels, False
+        self._group_labels = group_labels
+
+        labels = {}
+        comfortable = 0
+        for (_, names), label in zip(self._groups, group_labels):
+            for name in names:
+                labels[name] = label
+            if label == 1:
+                comfortable += len(names)
+        self.labels = labels
+        self.comfortable = comfortable
+        self.fraction = comfortable / len(self.names) if self.names else 0.0
+
+        if self.leds is not None:
+            self.leds.set_mode_hvac("COMFORTABLE" if self.fraction >= self.majority else "UNCOMFORTABLE")
+        return self.fraction, self.labels, True
+
+    def message(self):
+        """Aggregate and per-user labels of the last reading, as published on TOPIC_COMFORT."""
+        return {
+            "temperature": self.temperature,
+            "fraction": round(self.fraction, 3),
+            "comfortable": self.comfortable,
+            "occupants": len(self.names),
+            "users": self.labels,
+            "model_version": self.model.version
+        }
+
+
+def test_group_comfort(temperatures=(18.0, 26.0, 30.0, 31.0, 33.0, 35.0)):
+    """Check the group evaluator against ComfortML.predict for every age class and sex."""
+    model = ComfortML()
+    users = {f"u{age}{sex}": {"age": age, "sex": sex} for age in range(4) for sex in range(2)}
+    group = GroupComfortEvaluator(users, model)
+    ok = True
+    for t in temperatures:
+        fraction, labels, _ = group.evaluate(t)
+        expected = {name: model.predict(u["age"], u["sex"], t)[0] for name, u in users.items()}
+        ok = ok and labels == expected and fraction == sum(expected.values()) / len(users)
+        print(f"T={t}: {group.comfortable}/{len(users)} comfortable")
+    print(f"Group comfort: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def test_comfort_evaluator(temperatures=(20.0, 20.5, 20.5, 26.0, 31.0, 33.0, 35.0)):
+    """Check that label and probability follow every temperature, as ComfortML.predict."""
+    model = ComfortML()
+    ok = True
+    for age in range(4):
+        for sex in range(2):
+            evaluator = ComfortEvaluator(age, sex, model)
+            for t in temperatures:
+                label, prob, _ = evaluator.evaluate(t)
+                expected_label, expected_prob = model.predict(age, sex, t)
+                ok = ok and label == expected_label and abs(prob - expected_prob) < 1e-9
+    print(f"Comfort evaluator: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def test_comfort_table():
+    """Verify the comfort switch table against the float model over 0-40 °C."""
+    model = ComfortML()
+    print(f"Comfort model version: {model.version}, threshold {model.threshold}")
+    for age in range(4):
+        for sex in range(2):
+            limit = model._limits[age * 2 + sex]
+            print(f"age class {age}, sex {sex}: label {model.below_label} below {limit / 10}°C")
+    ok = model.verify_table(0.0, 40.0)
+
+    if model.load_curve():
+        print("Table rebuilt from", CURVE_FILE)
+        ok = model.verify_table(10.0, 40.0) and ok
+    return ok
+
+
+if __name__ == "__main__":
+    test_comfort_table()
+    test_group_comfort()
+    test_comfort_evaluator()
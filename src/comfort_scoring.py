@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from comfort_HVAC import ComfortML, PARAMS_FILE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Files exported by HVAC/train_model.py, next to this module unless overridden
+DEFAULT_PARAMS_FILE = os.getenv("COMFORT_PARAMS_FILE", os.path.join(HERE, PARAMS_FILE))
+DEFAULT_CURVE_FILE = os.getenv("COMFORT_CURVE_FILE", os.path.join(HERE, "comfort_curve.npz"))
+
+
+def load_surface(path=DEFAULT_CURVE_FILE):
+    """Comfort probability surface exported by train_model.py, None if the file is missing.
+    Returns a dict with temperature, probability[age_class, sex, temperature],
+    threshold and version."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as npz:
+        return {
+            "temperature": npz["temperature"].astype(np.float64),
+            "probability": npz["probability"].astype(np.float64),
+            "threshold": float(npz["threshold"]),
+            "version": str(npz["version"]),
+        }
+
+
+class ComfortScorer:
+    """Vectorized ComfortML for the backend.
+
+    Uses the firmware model's weights, bias, mean, scale and threshold, and
+    scores NumPy arrays of (age_class, sex, temperature) in one call. Inputs
+    broadcast, e.g. users as a column and temperatures as a row give one
+    probability series per user.
+    """
+    def __init__(self, model=None):
+        model = model if model is not None else ComfortML(DEFAULT_PARAMS_FILE)
+        self.version = model.version
+        self.weights = np.asarray(model.weights, dtype=np.float64)
+        self.mean = np.asarray(model.mean, dtype=np.float64)
+        self.scale = np.asarray(model.scale, dtype=np.float64)
+        self.bias = float(model.bias)
+        self.threshold = float(model.threshold)
+
+        # z = a * age + b * sex + c * temperature + d, folded from the normalization
+        self._coef = self.weights / self.scale
+        self._offset = self.bias - float(np.sum(self._coef * self.mean))
+
+    def logit(self, age_class, sex, temperature):
+        """Linear term of the logistic model."""
+        a, b, c = self._coef
+        user = a * np.asarray(age_class, dtype=np.float64) + b * np.asarray(sex, dtype=np.float64) + self._offset
+        return c * np.asarray(temperature, dtype=np.float64) + user
+
+    def probability(self, age_class, sex, temperature):
+        """Comfort probability for every (age_class, sex, temperature) element."""
+        z = self.logit(age_class, sex, temperature)
+        # 1 / (1 + exp(-z)) written with tanh, no overflow for large |z|
+        np.multiply(z, 0.5, out=z)
+        np.tanh(z, out=z)
+        z += 1.0
+        z *= 0.5
+        return z
+
+    def label(self, age_class, sex, temperature):
+        """Comfort label (1 comfortable, 0 not) for every element."""
+        return (self.probability(age_class, sex, temperature) >= self.threshold).astype(np.int8)
+
+    def score_users(self, users, temperatures):
+        """Probability series for every user.
+        users is a dict username -> {"age": age_class, "sex": sex}, returns
+        (names, matrix) with one row per user and one column per temperature."""
+        names = list(users)
+        ages = np.array([users[name]["age"] for name in names], dtype=np.float64)
+        sexes = np.array([users[name]["sex"] for name in names], dtype=np.float64)
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        return names, self.probability(ages[:, None], sexes[:, None], temperatures[None, :])
@@ -9,12 +9,17 @@ MQTT_USERNAME = ""
 MQTT_PASSWORD = ""
 MQTT_CLIENT_ID = ""
 
+# MQTT outbound queue (0 disables queueing, every message is published directly)
+MQTT_QUEUE_SIZE = 20      # Max queued messages, the oldest is dropped on overflow
+MQTT_FLUSH_SIZE = 4       # Flush once this many messages are queued (None disables)
+MQTT_FLUSH_AGE_MS = 10000 # Flush once the oldest message is this old (None disables)
+
 # MQTT topics
 TOPIC_TEMPERATURE = "weather/temperature"
 TOPIC_PRESSURE = "weather/pressure"
 TOPIC_ALL_DATA = "weather/alldata"
 TOPIC_CONTROL = "weather/control"
-TOPIC_COMFORT = "weather/comfort"
+TOPIC_COMFORT = "weather/comfort"   # multi-user comfort (main.py option 8)
 TOPIC_METRICS = "weather/metrics"
 TOPIC_SECURE = "weather/secure"
 
@@ -25,6 +30,12 @@ LED_PATTERNS = {
     "WIFI_CONNECTED": (0.05, 1.0),   # heartbeat
     "WIFI_ERROR": (0.3, 0.3),        # slow blink
 
+    # MQTT states and publish feedback (shown temporarily)
+    "MQTT_CONNECTING": (0.1, 0.1),
+    "MQTT_CONNECTED": (0.05, 0.45),
+    "DATA_SENT": (0.05, 0.25),       # short flash per publish
+    "ERROR": (0.1, 0.1),
+
     # Alerts
     "COMFORTABLE": (0.05, 0.95),     # calm pulse
     "UNCOMFORTABLE": (0.15, 0.15),   # noticeable blink
@@ -35,9 +46,23 @@ LED_PATTERNS = {
 SENSOR_I2C_CHANNEL = 0
 SENSOR_SCL_PIN = 20
 SENSOR_SDA_PIN = 21
+SENSOR_NOISE_TARGET_PA = 1.0  # Pressure RMS noise target, sets oversampling/IIR for forced mode
+SENSOR_MAX_LAG = 60           # Seconds the IIR filter may delay a step change
+SAMPLE_BUFFER_SIZE = 32       # Timer-sampled readings waiting to be published
+BURST_RATE_HZ = 25            # Internal sampling rate in burst mode (10-50 Hz)
+BURST_MAX_SAMPLES = 500       # Size of the preallocated burst buffers
+
+# Multi-user comfort: usernames from the registry in the room (empty = every registered user)
+COMFORT_OCCUPANTS = []
 
 # System configuration
 PUBLISH_INTERVAL = 5      # Seconds between readings
 ML_UPDATE_INTERVAL = 60   # Seconds between ML status updates
 WIFI_TIMEOUT = 20         # Seconds to wait for Wi-Fi connection
-MQTT_TIMEOUT = 10         # Seconds to wait for MQTT connection
\ No newline at end of file
+MQTT_TIMEOUT = 10         # Seconds to wait for MQTT connection
+RECONNECT_INTERVAL = 30   # Seconds between reconnection attempts while offline
+
+# Store-and-forward buffer on flash, used while Wi-Fi/MQTT is down
+OFFLINE_BUFFER_FILE = "offline_buf.bin"
+OFFLINE_BUFFER_CAPACITY = 720   # Readings kept (1 hour at 5s), the oldest are overwritten
+OFFLINE_REPLAY_BATCH = 20       # Readings per replayed MQTT message
\ No newline at end of file
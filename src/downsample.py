@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape of (x, y).
+    First and last points are always kept."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        # average of the next bucket (the last point for the final bucket)
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # point of this bucket forming the largest triangle with a and the next average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+
+    return indices
+
+
+def downsample(times, values, max_points):
+    """Reduce a (datetime64 times, values) series to at most max_points with LTTB.
+    Non-numeric series are returned unchanged."""
+    if max_points is None or len(times) <= max_points or values.dtype.kind not in "iuf":
+        return times, values
+
+    x = (times - times[0]).astype(np.int64).astype(np.float64)
+    y = values.astype(np.float64)
+    missing = np.isnan(y)
+    if missing.all():
+        return times, values
+    if missing.any():
+        # gaps do not attract the selection, they count as the series mean
+        y = np.where(missing, np.nanmean(y), y)
+
+    keep = lttb_indices(x, y, max_points)
+    return times[keep], values[keep]
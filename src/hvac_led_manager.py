@@ -1,13 +1,21 @@
 from machine import Pin
+from led_manager import default_engine
 
 class HVAC_LEDManager:
-    """Manages LED indicators for HVAC comfort status: green for comfortable, red for uncomfortable."""
-    def __init__(self, green_pin=15, red_pin=14):
+    """Manages LED indicators for HVAC comfort status: green for comfortable, red for uncomfortable.
+    Both pins are channels of the shared LED engine."""
+    def __init__(self, green_pin=15, red_pin=14, engine=None):
         self.green = Pin(green_pin, Pin.OUT)
         self.red = Pin(red_pin, Pin.OUT)
+        self.engine = engine if engine is not None else default_engine()
+        self.green_ch = self.engine.add(self.green, green_pin)
+        self.red_ch = self.engine.add(self.red, red_pin)
+        self.mode = None
         self.all_off()
 
     def set_mode_hvac(self, mode):
+        if mode == self.mode:
+            return
         if mode == "COMFORTABLE":
             self.set_comfortable()
         elif mode == "UNCOMFORTABLE":
@@ -17,13 +25,17 @@ class HVAC_LEDManager:
 
 
     def all_off(self):
-        self.green.value(0)
-        self.red.value(0)
+        self.engine.steady(self.green_ch, 0)
+        self.engine.steady(self.red_ch, 0)
+        self.mode = "OFF"
 
     def set_comfortable(self):
-        self.green.value(1)
-        self.red.value(0)
+        self.engine.steady(self.green_ch, 1, "COMFORTABLE")
+        self.engine.steady(self.red_ch, 0)
+        self.mode = "COMFORTABLE"
 
     def set_uncomfortable(self):
-        self.green.value(0)
-        self.red.value(1)
+        self.engine.steady(self.green_ch, 0)
+        self.engine.steady(self.red_ch, 1, "UNCOMFORTABLE")
+        self.mode = "UNCOMFORTABLE"
+
@@ -0,0 +1,80 @@
+import io
+import re
+
+import numpy as np
+import pandas as pd
+from influxdb_client import Dialect
+
+# Plain CSV with a header per table block and no annotation rows
+CSV_DIALECT = Dialect(header=True, delimiter=",", annotations=[], date_time_format="RFC3339Nano")
+
+# Tables with a different schema come as separate CSV blocks split by an empty line
+_BLOCK_SEPARATOR = re.compile(rb"\r?\n\r?\n")
+
+# "HH:MM:SS" label for every second of the day, formatting becomes an array lookup
+_HMS_LABELS = np.array(
+    [f"{h:02d}:{m:02d}:{s:02d}" for h in range(24) for m in range(60) for s in range(60)],
+    dtype=object
+)
+
+
+def _wanted_column(name):
+    return name in ("_time", "_value")
+
+
+def _parse_rfc3339(column):
+    """Parse RFC3339 UTC timestamps ("...Z") to datetime64[ns] without per-row Python objects."""
+    return np.char.rstrip(column.to_numpy(dtype="S35"), b"Z").astype("datetime64[ns]")
+
+
+def parse_csv_columns(raw):
+    """Parse a raw Flux CSV response into (times, values) NumPy columns.
+    times is datetime64[ns] (UTC), values keeps the column dtype (object if mixed)."""
+    times = []
+    values = []
+
+    for block in _BLOCK_SEPARATOR.split(raw):
+        if not block.strip():
+            continue
+        # _time is kept as raw bytes, Influx always sends UTC with a "Z" suffix
+        df = pd.read_csv(io.BytesIO(block), usecols=_wanted_column, dtype={"_time": "S35"})
+        if "_time" not in df or df.empty:
+            continue
+        times.append(_parse_rfc3339(df["_time"]))
+        if "_value" in df:
+            values.append(df["_value"].to_numpy())
+        else:
+            values.append(np.full(len(df), None, dtype=object))
+
+    if not times:
+        return np.empty(0, dtype="datetime64[ns]"), np.empty(0, dtype=object)
+    return np.concatenate(times), np.concatenate(values)
+
+
+def query_columns(query_api, flux_query):
+    """Run a Flux query and return its _time/_value columns as NumPy arrays."""
+    raw = query_api.query_raw(flux_query, dialect=CSV_DIALECT).data
+    return parse_csv_columns(raw)
+
+
+def format_times(times):
+    """Format a datetime64 array as a list of "HH:MM:SS" strings (UTC)."""
+    seconds = times.astype("datetime64[s]").astype(np.int64) % 86400
+    return _HMS_LABELS.take(seconds).tolist()
+
+
+def numeric_values(values):
+    """Value column as float64, non-numeric entries become NaN."""
+    if values.dtype.kind in "iuf":
+        return values.astype(np.float64)
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def values_to_list(values):
+    """Convert a value column to a JSON-ready list, NaN becomes None."""
+    if values.dtype.kind in "fO":
+        missing = pd.isna(values)
+        if missing.any():
+            values = values.astype(object)
+            values[missing] = None
+    return values.tolist()
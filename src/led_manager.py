@@ -1,165 +1,297 @@
 import time
+from array import array
 from machine import Pin, Timer
 
+# Patterns that override others and are shown 5x slower
+ALERT_PATTERNS = ("COMFORTABLE", "UNCOMFORTABLE", "ALERT", "ERROR")
+# Short feedback patterns, ignored while an alert is shown
+DATA_PATTERNS = ("DATA_SENT", "SENSOR_READING")
+EXTENSION_FACTOR = 5
+
+
+class LEDEngine:
+    """Drives LED patterns on any number of pins from one periodic timer.
+
+    A pattern is a table of step lengths in ticks, alternating on/off and
+    starting with on. Each channel plays either its base pattern (repeated
+    forever), a steady level, or a temporary overlay (a pattern with a duration
+    or a one-shot sequence) after which the base comes back. The timer only
+    runs while something is animated, and its callback only updates ints in
+    preallocated lists, so it allocates nothing.
+    """
+    def __init__(self, tick_ms=25, sequence_len=64):
+        self.tick_ms = tick_ms
+        self.sequence_len = sequence_len
+        self._timer = Timer()
+        self._running = False
+        # bound once, creating the bound method in the IRQ would allocate
+        self._callback = self._tick
+
+        # per channel state, index = channel
+        self._keys = {}
+        self.pins = []
+        self._steps = []       # step table being played, None when steady
+        self._count = []       # number of steps used in the table
+        self._index = []
+        self._left = []        # ticks left in the current step
+        self._repeat = []
+        self._expire = []      # ticks until an overlay ends, 0 = no limit
+        self._tag = []         # name of what is shown (mode name)
+        self._base_steps = []  # restored after an overlay, None = steady
+        self._base_level = []
+        self._base_tag = []
+        self._sequence = []    # scratch table for one-shot sequences
+
+    def add(self, pin, key=None):
+        """Register a Pin and return its channel number. A key (the GPIO id)
+        already registered reuses its channel instead of adding one."""
+        if key is not None and key in self._keys:
+            ch = self._keys[key]
+            self.pins[ch] = pin
+            self.steady(ch, 0)
+            return ch
+        if key is not None:
+            self._keys[key] = len(self.pins)
+        self.pins.append(pin)
+        for field in (self._steps, self._tag, self._base_steps, self._base_tag):
+            field.append(None)
+        for field in (self._count, self._index, self._left, self._expire, self._base_level):
+            field.append(0)
+        self._repeat.append(False)
+        self._sequence.append(array('H', bytearray(2 * self.sequence_len)))
+        pin.value(0)
+        return len(self.pins) - 1
+
+    def ticks(self, seconds):
+        """Convert a duration to a step length in ticks (at least one)."""
+        return max(1, int(seconds * 1000 / self.tick_ms + 0.5))
+
+    def compile(self, on_time, off_time):
+        """Step table for a blink pattern given in seconds."""
+        return array('H', (self.ticks(on_time), self.ticks(off_time)))
+
+    def play(self, ch, steps, tag=None, duration_ms=None, repeat=True, count=None):
+        """Play a step table. Repeating patterns without duration become the base."""
+        if count is None:
+            count = len(steps)
+        overlay = duration_ms or not repeat
+        if not overlay:
+            self._base_steps[ch] = steps
+            self._base_tag[ch] = tag
+
+        # the timer skips the channel while its table is None
+        self._steps[ch] = None
+        self._count[ch] = count
+        self._index[ch] = 0
+        self._left[ch] = steps[0]
+        self._repeat[ch] = repeat
+        self._expire[ch] = (duration_ms + self.tick_ms - 1) // self.tick_ms if duration_ms else 0
+        self._tag[ch] = tag
+        self.pins[ch].value(1)
+        self._steps[ch] = steps
+        self._start()
+
+    def steady(self, ch, level, tag=None):
+        """Stop any pattern on the channel and hold the LED at level (the new base)."""
+        self._steps[ch] = None
+        self._base_steps[ch] = None
+        self._base_level[ch] = level
+        self._base_tag[ch] = tag
+        self._tag[ch] = tag
+        self.pins[ch].value(level)
+
+    def sequence(self, ch):
+        """Scratch step table of the channel, fill it and call play_sequence."""
+        return self._sequence[ch]
+
+    def play_sequence(self, ch, count, tag=None):
+        """Play the first count steps of the scratch table once, then restore the base."""
+        if count:
+            self.play(ch, self._sequence[ch], tag, repeat=False, count=count)
+
+    def animating(self, ch):
+        return self._steps[ch] is not None
+
+    def tag(self, ch):
+        return self._tag[ch]
+
+    def _restore(self, ch):
+        steps = self._base_steps[ch]
+        if steps is None:
+            self._steps[ch] = None
+            self._tag[ch] = self._base_tag[ch]
+            self.pins[ch].value(self._base_level[ch])
+        else:
+            self._count[ch] = len(steps)
+            self._index[ch] = 0
+            self._left[ch] = steps[0]
+            self._repeat[ch] = True
+            self._expire[ch] = 0
+            self._tag[ch] = self._base_tag[ch]
+            self._steps[ch] = steps
+            self.pins[ch].value(1)
+
+    def _start(self):
+        if not self._running:
+            self._running = True
+            self._timer.init(period=self.tick_ms, mode=Timer.PERIODIC, callback=self._callback)
+
+    def _tick(self, t):
+        active = False
+        for ch in range(len(self.pins)):
+            steps = self._steps[ch]
+            if steps is None:
+                continue
+            active = True
+
+            expire = self._expire[ch]
+            if expire:
+                expire -= 1
+                self._expire[ch] = expire
+                if expire == 0:
+                    self._restore(ch)
+                    continue
+
+            left = self._left[ch] - 1
+            if left > 0:
+                self._left[ch] = left
+                continue
+
+            i = self._index[ch] + 1
+            if i >= self._count[ch]:
+                if not self._repeat[ch]:
+                    self._restore(ch)
+                    continue
+                i = 0
+            self._index[ch] = i
+            self._left[ch] = steps[i]
+            # even steps are on, odd steps are off
+            self.pins[ch].value(1 - (i & 1))
+
+        if not active:
+            self._running = False
+            self._timer.deinit()
+
+
+_default_engine = None
+
+
+def default_engine():
+    """Engine shared by every LED manager, one timer for the whole board."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = LEDEngine()
+    return _default_engine
+
+
 class LEDManager:
     """Manages single LED blinking patterns for status indication."""
-    def __init__(self, led_pin="LED"):
+    def __init__(self, led_pin="LED", engine=None):
         # Initialize LED on specified pin
         self.led = Pin(led_pin, Pin.OUT)
-        self.current_mode = None
-        self.timer = Timer()
-        self.blink_active = False
-        self.led_state = 0
+        self.engine = engine if engine is not None else default_engine()
+        self.channel = self.engine.add(self.led, led_pin)
         
-        # default LED states from config
+        # default LED states from config, compiled to step tables
         self.status_patterns = {}
+        self._tables = {}
+        self._unknown = set()
         
         print("LED Manager initialized (single LED mode)")
     
+    @property
+    def current_mode(self):
+        return self.engine.tag(self.channel)
+    
+    @property
+    def blink_active(self):
+        return self.engine.animating(self.channel)
+    
+    @property
+    def led_state(self):
+        return self.led.value()
+    
     def set_status_patterns(self, patterns):
         """Set the blinking patterns dictionary for different status modes."""
         self.status_patterns = patterns
+        self._tables = {}
+        for name, (on_time, off_time) in patterns.items():
+            # alerts are shown with extended timing
+            if name in ALERT_PATTERNS:
+                on_time = on_time * EXTENSION_FACTOR
+                off_time = off_time * EXTENSION_FACTOR
+            self._tables[name] = self.engine.compile(on_time, off_time)
     
     def set_mode(self, mode_name, duration_ms=None):
-        """Set LED mode with pattern priority handling for alerts vs data patterns."""
-        if mode_name not in self.status_patterns:
-            print(f"LED mode '{mode_name}' not found. Available: {list(self.status_patterns.keys())}")
+        """Set LED mode with pattern priority handling for alerts vs data patterns.
+        With duration_ms the mode is shown temporarily, then the previous base mode comes back."""
+        steps = self._tables.get(mode_name)
+        if steps is None:
+            if mode_name not in self._unknown:
+                # warn once, this is called on the publish path
+                self._unknown.add(mode_name)
+                print(f"LED mode '{mode_name}' not found. Available: {list(self.status_patterns.keys())}")
             return False
     
-        # check if this is an alert/temperature pattern that should override others
-        alert_patterns = ["COMFORTABLE", "UNCOMFORTABLE", "ALERT", "ERROR"]
-        data_patterns = ["DATA_SENT", "SENSOR_READING"]
-    
-        current_is_alert = self.current_mode in alert_patterns
-        new_is_alert = mode_name in alert_patterns
-        current_is_data = self.current_mode in data_patterns
-    
+        current = self.engine.tag(self.channel)
+        
         # if an alert is already shown, don't interrupt with data patterns
-        if current_is_alert and mode_name in data_patterns:
+        if current in ALERT_PATTERNS and mode_name in DATA_PATTERNS:
             return False
+        
+        # already showing this base mode, nothing to restart
+        if duration_ms is None and current == mode_name and self.engine.animating(self.channel):
+            return True
     
-        # if we have a data pattern showing and get an alert, stop the data pattern
-        if current_is_data and new_is_alert:
-            print(f"Stopping data pattern {self.current_mode} for alert {mode_name}")
-            self.stop_blink()
-    
-        # check if we want extended duration
-        extended = mode_name in alert_patterns
-    
-        # get timing values
-        on_time, off_time = self.status_patterns[mode_name]
-    
-        # apply extension for alert patterns
-        if extended:
-            EXTENSION_FACTOR = 5  # 5x longer for alerts
-            on_time = on_time * EXTENSION_FACTOR
-            off_time = off_time * EXTENSION_FACTOR
-        else:
-            pass
-    
-        # Calculate timing
-        period_ms = int((on_time + off_time) * 1000)
-        duty_cycle = on_time / (on_time + off_time)
-    
-        # Start blinking
-        self.start_blink(period_ms, duty_cycle, duration_ms)
-    
-        # Update current mode
-        self.current_mode = mode_name
-    
+        self.engine.play(self.channel, steps, mode_name, duration_ms)
         return True
     
     def start_blink(self, period_ms, duty_cycle, duration_ms=None):
         """Start blinking with specified period, duty cycle, and optional duration."""
-        if self.blink_active:
-            self.stop_blink()
-        
-        on_time_ms = int(period_ms * duty_cycle)
-        
-        self.timer.init(
-            period=period_ms,
-            mode=Timer.PERIODIC,
-            callback=lambda t: self._toggle_led(on_time_ms)
-        )
-        
-        self.blink_active = True
-        
-        if duration_ms:
-            Timer(-1).init(
-                mode=Timer.ONE_SHOT,
-                period=duration_ms,
-                callback=lambda t: self.stop_blink()
-            )
-    
-    def _toggle_led(self, on_time_ms):
-        """Internal method to toggle LED state during blinking."""
-        if self.led_state == 0:
-            # turn LED on
-            self.led.value(1)
-            self.led_state = 1
-            # schedule turn off
-            Timer(-1).init(
-                mode=Timer.ONE_SHOT,
-                period=on_time_ms,
-                callback=lambda t: self.led.off() or setattr(self, 'led_state', 0)
-            )
-        else:
-            # turn LED off
-            self.led.value(0)
-            self.led_state = 0
+        on_time = period_ms * duty_cycle / 1000
+        steps = self.engine.compile(on_time, period_ms / 1000 - on_time)
+        self.engine.play(self.channel, steps, "BLINK", duration_ms)
     
     def stop_blink(self):
         """Stop blinking and turn LED off."""
-        if hasattr(self, 'timer'):
-            try:
-                self.timer.deinit()
-            except:
-                pass
-        
-        self.led.value(0)
-        self.led_state = 0
-        self.blink_active = False
-        self.current_mode = None
+        self.engine.steady(self.channel, 0)
     
     def solid_on(self):
         """Turn LED solid on."""
-        self.stop_blink()
-        self.led.value(1)
-        self.current_mode = "SOLID_ON"
+        self.engine.steady(self.channel, 1, "SOLID_ON")
     
     def solid_off(self):
         """Turn LED solid off."""
-        self.stop_blink()
-        self.led.value(0)
-        self.current_mode = "SOLID_OFF"
+        self.engine.steady(self.channel, 0, "SOLID_OFF")
     
     def pulse(self, count=1, pulse_duration=0.1):
-        """Pulse the LED a specified number of times."""
-        self.stop_blink()
-        
-        for i in range(count):
-            self.led.value(1)
-            time.sleep(pulse_duration)
-            self.led.value(0)
-            if i < count - 1:
-                time.sleep(pulse_duration)
-        
-        self.current_mode = f"PULSE_{count}"
+        """Pulse the LED a specified number of times (returns immediately)."""
+        steps = self.engine.sequence(self.channel)
+        ticks = self.engine.ticks(pulse_duration)
+        n = min(2 * count, len(steps))
+        for i in range(n):
+            steps[i] = ticks
+        self.engine.play_sequence(self.channel, n, "PULSE")
     
     def indicate_error(self, error_code):
-        """Indicate error code with blinking pattern (number of blinks per digit)."""
-        self.stop_blink()
-        
+        """Indicate error code with blinking pattern (number of blinks per digit), returns immediately."""
+        steps = self.engine.sequence(self.channel)
+        blink = self.engine.ticks(0.2)
+        gap = self.engine.ticks(0.5)
+        n = 0
         for digit in str(error_code):
-            if digit.isdigit():
-                num = int(digit)
-                # blink for the number
-                for _ in range(num):
-                    self.led.value(1)
-                    time.sleep(0.2)
-                    self.led.value(0)
-                    time.sleep(0.2)
-                time.sleep(0.5)
+            if not digit.isdigit():
+                continue
+            for _ in range(int(digit)):
+                if n + 2 > len(steps):
+                    break
+                steps[n] = blink
+                steps[n + 1] = blink
+                n += 2
+            if n:
+                # pause between digits on the last off step
+                steps[n - 1] = blink + gap
+        self.engine.play_sequence(self.channel, n, "ERROR_CODE")
         
         print(f"LED Error indication: {error_code}")
     
@@ -200,9 +332,12 @@ def test_led_manager():
     led.pulse(3)
     time.sleep(1)
     led.pulse(5)
+    time.sleep(1.2)
     
     print("\nTesting error indication:")
     led.indicate_error(404)
+    # pulses and error codes play in the background
+    time.sleep(4.5)
     
     print("\nLED test complete!")
     led.solid_off()
@@ -9,12 +9,14 @@ import time
 import machine
 from wifi_manager import WiFiManager
 from mqtt_client import MQTTManager
-from sensor_manager import WeatherSensor
+from sensor_manager import WeatherSensor, TimerSampler, BurstSampler
 from ml_predictor import MLPredictor  # Your working predictor
 from led_manager import LEDManager  # New LED manager
-from comfort_HVAC import ComfortML
+from comfort_HVAC import ComfortEvaluator, GroupComfortEvaluator
 from hvac_led_manager import HVAC_LEDManager
-from user_registry import get_user, register_user
+from user_registry import get_user, register_user, load_users
+from offline_buffer import OfflineBuffer
+from payload_codec import encode_payload
 
 
 import config
@@ -22,7 +24,11 @@ import config
 SCENARIO_NAME = "undefined"
 TEST_START_TIME = None
 
-def main_exec(duration_seconds=None, scenario_name="normal", payload_mode="normal", hvac = False, age=None, sex=None):
+# Prediction horizons in minutes, published as weather/predictions/<n>min
+PREDICTION_HORIZONS = (5, 15, 30)
+TOPIC_PREDICTIONS_ALL = "weather/predictions/all"
+
+def main_exec(duration_seconds=None, scenario_name="normal", payload_mode="normal", hvac = False, age=None, sex=None, combined_predictions=False, burst=False, occupants=None):
     """Test ML predictions with Wi-Fi, MQTT, and sensor integration. Publishes temperature readings and predictions."""
     print("=" * 60)
     print("TEST: ML PREDICTIONS TO MQTT")
@@ -58,13 +64,24 @@ def main_exec(duration_seconds=None, scenario_name="normal", payload_mode="norma
         config.MQTT_PORT,
         config.MQTT_USERNAME,
         config.MQTT_PASSWORD,
-        "pico-ml-test"
+        "pico-ml-test",
+        queue_size=config.MQTT_QUEUE_SIZE,
+        flush_size=config.MQTT_FLUSH_SIZE,
+        flush_age_ms=config.MQTT_FLUSH_AGE_MS
     )
     
-    if not mqtt.connect():
-        print("MQTT failed")
-        wifi.disconnect()
-        return
+    # Readings taken while offline are kept on flash and replayed on reconnect
+    offline = OfflineBuffer(
+        config.OFFLINE_BUFFER_FILE,
+        capacity=config.OFFLINE_BUFFER_CAPACITY,
+        batch_size=config.OFFLINE_REPLAY_BATCH
+    )
+    mqtt.attach_offline_buffer(offline, config.TOPIC_TEMPERATURE, config.TOPIC_PRESSURE, scenario_name)
+
+    online = mqtt.connect()
+    if not online:
+        print("MQTT failed, buffering readings until the broker is reachable")
+    last_reconnect = time.time()
     
     # 3. Initialize sensor
     print("[3/3] Initializing sensor...")
@@ -74,17 +91,38 @@ def main_exec(duration_seconds=None, scenario_name="normal", payload_mode="norma
         mqtt.disconnect()
         wifi.disconnect()
         return
+    if burst:
+        # High-rate window per interval, published as one aggregated reading
+        sampler = BurstSampler(sensor, config.PUBLISH_INTERVAL, config.BURST_RATE_HZ,
+                               max_samples=config.BURST_MAX_SAMPLES)
+    else:
+        # Timer-driven forced conversions, the sensor sleeps in between and
+        # readings wait in a ring buffer until the loop publishes them
+        sampler = TimerSampler(sensor, config.PUBLISH_INTERVAL,
+                               config.SENSOR_NOISE_TARGET_PA, config.SENSOR_MAX_LAG,
+                               capacity=config.SAMPLE_BUFFER_SIZE)
     
     # 4. Initialize ML
     print("\nInitializing YOUR ML predictor...")
     ml = MLPredictor(reading_interval=config.PUBLISH_INTERVAL)
+
+    if hvac:
+        # Built once: GPIO setup and the user's age/sex terms are reused every reading
+        hvac_led = HVAC_LEDManager()
+        comfort = ComfortEvaluator(age, sex, leds=hvac_led)
+    elif occupants:
+        # Every occupant per reading, HVAC LEDs follow the majority
+        hvac_led = HVAC_LEDManager()
+        comfort = GroupComfortEvaluator(occupants, leds=hvac_led)
     
     # Ready
     print("\nREADY!")
     print("Will publish ML predictions to:")
-    print("  - weather/predictions/5min")
-    print("  - weather/predictions/15min")
-    print("  - weather/predictions/30min")
+    if combined_predictions:
+        print(f"  - {TOPIC_PREDICTIONS_ALL}")
+    else:
+        for minutes in PREDICTION_HORIZONS:
+            print(f"  - weather/predictions/{minutes}min")
     print("\nStarting in 2 seconds...")
     time.sleep(2)
     
@@ -104,29 +142,28 @@ def main_exec(duration_seconds=None, scenario_name="normal", payload_mode="norma
                 if elapsed >= duration_seconds:
                     print(f"\nScenario '{scenario_name}': Duration of {duration_seconds} seconds reached, ending test.")
                     break
-            temp, pres = sensor.read()
+            temp, pres = sampler.read()
             
-            if temp > 25:
+            if temp is None:
+                # no sample (sensor fault), keep flushing and reconnecting below
+                led.set_mode("ERROR")
+            elif temp > 25:
                 led.set_mode("ALERT")
             elif temp < 18:
                 led.set_mode("UNCOMFORTABLE")
             else:
                 led.set_mode("COMFORTABLE")
 
-            if hvac:
-                hvac_led = HVAC_LEDManager()
-                model = ComfortML()
-
-                print("\nComfort prediction running")
-                
-                label, confidence = model.predict(age, sex, temp)
-
-                if label == 1:
-                    hvac_led.set_mode_hvac("COMFORTABLE")
-                    print(f"{temp}°C → Comfortable (p={confidence:.2f})")
-                else:
-                    hvac_led.set_mode_hvac("UNCOMFORTABLE")
-                    print(f"{temp}°C → Uncomfortable (p={confidence:.2f})")
+            if hvac and temp is not None:
+                # Only recomputed when the temperature changes, LEDs switch on label change
+                label, confidence, changed = comfort.evaluate(temp)
+                if changed:
+                    state = "Comfortable" if label == 1 else "Uncomfortable"
+                    print(f"\nComfort: {temp}°C → {state} (p={confidence:.2f})")
+            elif occupants and temp is not None:
+                fraction, labels, changed = comfort.evaluate(temp)
+                if changed:
+                    print(f"\nComfort: {temp}°C → {comfort.comfortable}/{len(labels)} occupants comfortable")
 
             if temp is not None:
                 reading_count += 1
@@ -138,11 +175,11 @@ def main_exec(duration_seconds=None, scenario_name="normal", payload_mode="norma
                 payload = {
                     "id": msg_id,
                     "temperature": temp,
-                    "timestamp": time.time(),
+                    "timestamp": sampler.timestamp,  # when the sample was taken
                     "scenario": scenario_name
                 }
 
-                if payload_mode == "large":
+                if payload_mode in ("large", "binary"):
                     pred_5min = ml.predict_next(minutes_ahead=5)
                     payload["confidence"] = pred_5min["confidence"]
                     payload["change_per_sec"] = pred_5min["change_per_sec"]
@@ -151,71 +188,96 @@ def main_exec(duration_seconds=None, scenario_name="normal", payload_mode="norma
                     payload["data_points"] = pred_5min["data_points"]
                     payload["prediction_id"] = pred_5min["prediction_id"]
 
-
-                mqtt.publish(config.TOPIC_TEMPERATURE, payload)
-                mqtt.publish(config.TOPIC_PRESSURE, pres)
+                if burst:
+                    # Window min/max/stddev, same message count as a single sample
+                    payload.update(sampler.stats)
+
+                # Same content as "large", packed in the versioned binary format
+                message = encode_payload(payload) if payload_mode == "binary" else payload
+
+                reading = (msg_id, payload["timestamp"], temp, pres)
+                if online:
+                    # Timestamped so batched pressure readings keep their sample time
+                    pressure = {"timestamp": payload["timestamp"], "pressure": pres}
+                    # Topics that were not sent go to the offline buffer, never twice
+                    online = mqtt.send_reading(message, pressure, reading)
+                    if online and occupants:
+                        # Aggregate and per-user labels in one message per reading
+                        comfort_message = comfort.message()
+                        comfort_message["id"] = msg_id
+                        comfort_message["timestamp"] = payload["timestamp"]
+                        online = mqtt.enqueue(config.TOPIC_COMFORT, comfort_message)
+                else:
+                    # Store-and-forward, keeps the original timestamp
+                    offline.append(*reading)
                 
                 # Make ML prediction every 30 seconds (or 6 readings at 5s interval)
-                if reading_count % 6 == 0:
+                if online and reading_count % 6 == 0:
                     print("\n" + "─" * 40)
                     print(f"ML PREDICTION #{reading_count//6}")
                     print("─" * 40)
                     
-                    # Create predictions for different timeframes
-                    predictions = []
-                    
-                    # 5-minute prediction
-                    pred_5min = ml.predict_next(minutes_ahead=5)
-                    pred_5min["timeframe"] = "5min"
-                    predictions.append(("5min", pred_5min))
-                    
-                    # 15-minute prediction  
-                    pred_15min = ml.predict_next(minutes_ahead=15)
-                    pred_15min["timeframe"] = "15min"
-                    predictions.append(("15min", pred_15min))
-                    
-                    # 30-minute prediction
-                    pred_30min = ml.predict_next(minutes_ahead=30)
-                    pred_30min["timeframe"] = "30min"
-                    predictions.append(("30min", pred_30min))
-                    
-                    # Publish all predictions
-                    for timeframe, prediction in predictions:
-                        topic = f"weather/predictions/{timeframe}"
-                        success = mqtt.publish(topic, prediction)
-                        
-                        if success:
-                            print(f"{timeframe}: {prediction['predicted']}°C")
-                        else:
-                            print(f"Failed to publish {timeframe}")
-                    
+                    # One pass for every timeframe, shared state computed once
+                    batch = ml.predict_horizons(PREDICTION_HORIZONS)
+
+                    if combined_predictions:
+                        # Single message for all timeframes
+                        success = mqtt.publish(TOPIC_PREDICTIONS_ALL, batch)
+                        for timeframe, predicted in batch["predictions"].items():
+                            if success:
+                                print(f"{timeframe}: {predicted}°C")
+                            else:
+                                print(f"Failed to publish {timeframe}")
+                    else:
+                        # Publish all predictions
+                        for timeframe, prediction in ml.expand_horizons(batch):
+                            topic = f"weather/predictions/{timeframe}"
+                            success = mqtt.publish(topic, prediction)
+
+                            if success:
+                                print(f"{timeframe}: {prediction['predicted']}°C")
+                            else:
+                                print(f"Failed to publish {timeframe}")
+
                     # Show details for 5-minute prediction
-                    print(f"\nCurrent: {pred_5min['current']}°C")
-                    print(f"Predicted (5min): {pred_5min['predicted']}°C")
-                    print(f"Trend: {pred_5min['trend']}")
-                    print(f"Confidence: {pred_5min['confidence']*100:.0f}%")
+                    print(f"\nCurrent: {batch['current']}°C")
+                    print(f"Predicted (5min): {batch['predictions']['5min']}°C")
+                    print(f"Trend: {batch['trend']}")
+                    print(f"Confidence: {batch['confidence']*100:.0f}%")
                 
                 # Simple status every 10 readings
                 if reading_count % 10 == 0:
                     print(f"\nStatus: {reading_count} readings processed")
             
-            # Check for MQTT messages
-            mqtt.check_messages()
+            if online:
+                # Send queued readings if the flush policy is met
+                online = mqtt.flush()
+
+                # Check for MQTT messages
+                mqtt.check_messages()
+            elif time.time() - last_reconnect >= config.RECONNECT_INTERVAL:
+                # Reconnect, a successful connect replays the offline buffer
+                last_reconnect = time.time()
+                if wifi.is_connected() or wifi.connect(timeout=config.WIFI_TIMEOUT):
+                    online = mqtt.connect()
+                print(f"Reconnect {'succeeded' if online else 'failed'} ({len(offline)} readings buffered)")
             
-            time.sleep(config.PUBLISH_INTERVAL)
+            # Wait for the next sampling slot (the timer sampler paces itself)
+            sampler.wait()
             
     except KeyboardInterrupt:
-        if hvac:
+        if hvac or occupants:
             hvac_led.set_mode_hvac("OFF")
         led.solid_off()
         print("\n\nTest stopped by user")
     except Exception as e:
-        if hvac:
+        if hvac or occupants:
             hvac_led.set_mode_hvac("OFF")
         led.solid_off()
         print(f"\n\nError: {e}")
     finally:
         print("\nCleaning up...")
+        sampler.stop()
         mqtt.disconnect()
         wifi.disconnect()
         print("Test complete!")
@@ -258,8 +320,11 @@ if __name__ == "__main__":
     print("3. Evaluation Scenario: Small/Large n° of messages")
     print("4. Evaluation Scenario: Small/Large payload")
     print("5. Thermal Comfort prediction model (Age + Sex + Temperature)")
+    print("6. Burst capture (high-rate sampling aggregated per reading)")
+    print("7. Async runtime (cooperative uasyncio tasks)")
+    print("8. Multi-user thermal comfort (every occupant per reading)")
 
-    choice = input("Enter 1, 2, 3, 4 or 5: ").strip()
+    choice = input("Enter 1, 2, 3, 4, 5, 6, 7 or 8: ").strip()
     
     if choice == "1":
         config.PUBLISH_INTERVAL = 5  # normal interval
@@ -292,7 +357,7 @@ if __name__ == "__main__":
         config.PUBLISH_INTERVAL = 5
         main_exec(scenario_name="normal")
     elif choice == "4":
-        # Same message rate in two scenarios for fairness
+        # Same message rate in all scenarios for fairness
         config.PUBLISH_INTERVAL = 5
 
         # SMALL payload
@@ -313,6 +378,15 @@ if __name__ == "__main__":
 
         time.sleep(5)
 
+        # BINARY payload (large content, compact encoding)
+        main_exec(
+            duration_seconds=5 * 60,
+            scenario_name="binary_payload",
+            payload_mode="binary"
+        )
+
+        time.sleep(5)
+
         # NORMAL mode
         print("\nSwitching to normal operation")
         main_exec(
@@ -345,5 +419,24 @@ if __name__ == "__main__":
             print("User registered successfully.")
         
         main_exec(scenario_name="normal", hvac = True, age=age_class, sex=sex)
+    elif choice == "6":
+        config.PUBLISH_INTERVAL = 5
+        main_exec(scenario_name="burst", burst=True)
+    elif choice == "7":
+        import async_main
+        async_main.main(scenario_name="normal")
+    elif choice == "8":
+        # Configured occupants, or every registered user if none are configured
+        users = load_users()
+        names = config.COMFORT_OCCUPANTS or sorted(users)
+        occupants = {name: users[name] for name in names if name in users}
+        missing = [name for name in names if name not in users]
+        if missing:
+            print(f"Not registered (use option 5 first): {', '.join(missing)}")
+        if occupants:
+            print(f"Occupants: {', '.join(sorted(occupants))}")
+            main_exec(scenario_name="normal", occupants=occupants)
+        else:
+            print("No registered occupants")
     else:
         print("Invalid choice")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import time
+from array import array
 
 class MLPredictor:
     """
@@ -7,59 +8,103 @@ class MLPredictor:
     """
 
     def __init__(self, window_size=50, reading_interval=5):
-        self.history = []
         self.window_size = window_size
         self.reading_interval = reading_interval
         self.prediction_count = 0
 
+        # Preallocated ring buffer, ingestion never allocates
+        self._buf = array('f', [0.0] * window_size)
+        self._head = 0       # next write position
+        self._count = 0      # valid readings in the buffer
+        self._seen = 0       # readings seen since start (EMA warm-up)
+        self._last = None    # latest reading, kept as a full precision float
+
         # EMA smoothing factor
         self.alpha = 0.2
 
+        # Cached EMA state, updated once per reading
+        self._ema_rate = 0.0
+        self._rate = 0.0
+        self._per_min = 0.0
+        self._per_hour = 0.0
+
         print(f"MLPredictor ready (window={window_size}, interval={reading_interval}s)")
 
-    
+
     # Data ingestion
     def add_reading(self, temperature):
-        """Add a temperature reading to the history buffer."""
-        self.history.append(round(temperature, 1))
+        """Add a temperature reading to the ring buffer and update the EMA rate."""
+        temperature = round(temperature, 1)
+
+        if self._last is not None:
+            delta = (temperature - self._last) / self.reading_interval
+            if self._seen == 1:
+                # Initial rate estimate
+                self._ema_rate = delta
+            else:
+                self._ema_rate = self.alpha * delta + (1 - self.alpha) * self._ema_rate
+
+        self._buf[self._head] = temperature
+        self._head = (self._head + 1) % self.window_size
+        if self._count < self.window_size:
+            self._count += 1
+        self._seen += 1
+        self._last = temperature
+
+        # Need at least 3 readings before trusting the rate
+        self._rate = self._ema_rate if self._seen >= 3 else 0.0
+        # Physical sanity bounds
+        self._per_hour = max(-5.0, min(5.0, self._rate * 3600))
+        self._per_min = max(-1.0, min(1.0, self._rate * 60))
 
-        if len(self.history) > self.window_size:
-            self.history.pop(0)
+    @property
+    def history(self):
+        """Buffered readings, oldest first. Allocates a list, keep off the hot path."""
+        start = (self._head - self._count) % self.window_size
+        return [self._buf[(start + i) % self.window_size] for i in range(self._count)]
 
     # Internal helpers
     def _smoothed_rate_c_per_sec(self):
-        """Returns smoothed temperature change rate in °C per second using exponential moving average over per-reading deltas."""
-        n = len(self.history)
-        if n < 3:
-            return 0.0
-
-        # Initial rate estimate
-        rate = (self.history[1] - self.history[0]) / self.reading_interval
-
-        # EMA over deltas
-        for i in range(2, n):
-            delta = (self.history[i] - self.history[i - 1]) / self.reading_interval
-            rate = self.alpha * delta + (1 - self.alpha) * rate
-
-        return rate
+        """Returns smoothed temperature change rate in °C per second (cached EMA over per-reading deltas)."""
+        return self._rate
 
     def _change_per_hour(self):
         """Returns bounded temperature change per hour (°C/hour)."""
-        change_per_hour = self._smoothed_rate_c_per_sec() * 3600
-        # Physical sanity bounds
-        return max(-5.0, min(5.0, change_per_hour))
+        return self._per_hour
 
     def _change_per_min(self):
         """Return bounded temperature change per minute (°C/min)."""
-        change_per_min = self._smoothed_rate_c_per_sec() * 60
-        return max(-1.0, min(1.0, change_per_min))
+        return self._per_min
+
+    def _predicted_temp(self, minutes_ahead):
+        """Extrapolate the cached rate, bounded to a plausible swing and range."""
+        # Limit extrapolation swing
+        predicted_change = max(-3.0, min(3.0, self._rate * minutes_ahead * 60))
+        # Fix to plausible temperature range
+        return max(0.0, min(40.0, self._last + predicted_change))
+
+    def _trend(self):
+        """Classify the cached rate as rising, falling or stable."""
+        if self._rate > 0.0005:        # °C/hour
+            return "rising"
+        elif self._rate < -0.0005:     # °C/hour
+            return "falling"
+        return "stable"
+
+    def _confidence(self):
+        """Confidence from buffer fill level and rate stability."""
+        data_factor = min(1.0, self._count / self.window_size)
+        stability_factor = 1.0 - min(1.0, abs(self._per_hour) / 5.0)
+
+        confidence = 0.2 + 0.7 * data_factor * stability_factor
+        return round(confidence, 2)
 
     # Prediction API
     def predict_next(self, minutes_ahead=5):
         """Generate temperature prediction for specified minutes ahead with trend and confidence."""
         self.prediction_count += 1
 
-        if not self.history:
+        if self._last is None:
             return {
                 "current": 0,
                 "predicted": 0,
@@ -68,46 +113,57 @@ class MLPredictor:
                 "prediction_id": self.prediction_count
             }
 
-        current_temp = self.history[-1]
-
-        # Smoothed rate
-        rate_per_sec = self._smoothed_rate_c_per_sec()
-
-        # Prediction
-        seconds_ahead = minutes_ahead * 60
-        predicted_change = rate_per_sec * seconds_ahead
-
-        # Limit extrapolation swing
-        predicted_change = max(-3.0, min(3.0, predicted_change))
-        predicted_temp = current_temp + predicted_change
-
-        # Fix to plausible temperature range
-        predicted_temp = max(0.0, min(40.0, predicted_temp))
-
-        # Trend classification
-        if rate_per_sec > 0.0005:        # °C/hour
-            trend = "rising"
-        elif rate_per_sec < -0.0005:     # °C/hour
-            trend = "falling"
-        else:
-            trend = "stable"
+        return {
+            "current": round(self._last, 1),
+            "predicted": round(self._predicted_temp(minutes_ahead), 1),
+            "trend": self._trend(),
+            "confidence": self._confidence(),
+            "change_per_sec": round(self._rate, 4),
+            "change_per_min": round(self._per_min, 2),
+            "change_per_hour": round(self._per_hour, 2),
+            "prediction_id": self.prediction_count,
+            "data_points": self._count,
+            "timestamp": time.time()
+        }
 
-        # Confidence estimation
-        data_factor = min(1.0, len(self.history) / self.window_size)
-        stability_factor = 1.0 - min(1.0, abs(self._change_per_hour()) / 5.0)
+    def predict_horizons(self, horizons=(5, 15, 30)):
+        """Predict several horizons (minutes) in one pass. Shared fields are computed once,
+        'predictions' maps "<n>min" to the predicted temperature."""
+        self.prediction_count += 1
 
-        confidence = 0.2 + 0.7 * data_factor * stability_factor
-        confidence = round(confidence, 2)
+        if self._last is None:
+            return {
+                "current": 0,
+                "trend": "no_data",
+                "confidence": 0.1,
+                "prediction_id": self.prediction_count,
+                "predictions": {f"{m}min": 0 for m in horizons}
+            }
 
         return {
-            "current": round(current_temp, 1),
-            "predicted": round(predicted_temp, 1),
-            "trend": trend,
-            "confidence": confidence,
-            "change_per_sec": round(rate_per_sec, 4),
-            "change_per_min": round(self._change_per_min(), 2),
-            "change_per_hour": round(self._change_per_hour(), 2),
+            "current": round(self._last, 1),
+            "trend": self._trend(),
+            "confidence": self._confidence(),
+            "change_per_sec": round(self._rate, 4),
+            "change_per_min": round(self._per_min, 2),
+            "change_per_hour": round(self._per_hour, 2),
             "prediction_id": self.prediction_count,
-            "data_points": len(self.history),
-            "timestamp": time.time()
+            "data_points": self._count,
+            "timestamp": time.time(),
+            "predictions": {f"{m}min": round(self._predicted_temp(m), 1) for m in horizons}
         }
+
+    def expand_horizons(self, batch):
+        """Split a predict_horizons() result into (timeframe, prediction) pairs shaped like predict_next().
+        Every pair gets its own prediction_id, as separate predict_next() calls would."""
+        expanded = []
+        for timeframe, predicted in batch["predictions"].items():
+            prediction = {k: v for k, v in batch.items() if k != "predictions"}
+            prediction["predicted"] = predicted
+            prediction["timeframe"] = timeframe
+            if expanded:
+                # the first pair keeps the batch id
+                self.prediction_count += 1
+                prediction["prediction_id"] = self.prediction_count
+            expanded.append((timeframe, prediction))
+        return expanded
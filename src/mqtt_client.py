@@ -1,24 +1,127 @@
 import time
+import json
 from machine import Pin
 import ssl
 
+from offline_buffer import PENDING_ALL, PENDING_TEMPERATURE, PENDING_PRESSURE
+
+# umqtt.simple, not umqtt.robust: robust retries a failed publish forever, the
+# failure has to reach enqueue()/flush() so readings go to the offline buffer
 try:
-    from umqtt.robust import MQTTClient
-    print("Imported umqtt.robust")
+    from umqtt.simple import MQTTClient
+    print("Imported umqtt.simple")
 except ImportError:
     try:
         import sys
         sys.path.append('/lib')
-        from umqtt.robust import MQTTClient
+        from umqtt.simple import MQTTClient
         print("Imported from /lib")
     except ImportError as e:
         print(f"cannot import MQTTClient: {e}")
-        print("Install: import mip; mip.install('umqtt.robust')")
+        print("Install: import mip; mip.install('umqtt.simple')")
         MQTTClient = None
 
+class PublishQueue:
+    """Bounded outbound message queue with drop-oldest overflow and a size/age flush policy."""
+    def __init__(self, capacity=20, flush_size=5, flush_age_ms=10000):
+        # capacity: max queued messages, the oldest is dropped on overflow
+        # flush_size: flush once this many messages are queued (None disables)
+        # flush_age_ms: flush once the oldest message is this old (None disables)
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.flush_age_ms = flush_age_ms
+
+        # preallocated slots, used as a ring
+        self._topics = [None] * capacity
+        self._messages = [None] * capacity
+        self._readings = [None] * capacity
+        self._stamps = [0] * capacity
+        self._head = 0
+        self._count = 0
+
+        # counters
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._count
+
+    def _push(self, topic, message, reading, stamp):
+        if self._count == self.capacity:
+            # drop oldest
+            self._topics[self._head] = None
+            self._messages[self._head] = None
+            self._readings[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+            self._count -= 1
+            self.dropped += 1
+
+        i = (self._head + self._count) % self.capacity
+        self._topics[i] = topic
+        self._messages[i] = message
+        self._readings[i] = reading
+        self._stamps[i] = stamp
+        self._count += 1
+
+    def put(self, topic, message, reading=None):
+        """Queue a message, dropping the oldest one if the queue is full.
+        reading: (msg_id, timestamp, temperature, pressure) the message was built from."""
+        self._push(topic, message, reading, time.ticks_ms())
+        self.queued += 1
+
+    def requeue(self, topic, messages, readings, stamp):
+        """Put back messages whose flush failed, keeping their original age."""
+        for message, reading in zip(messages, readings):
+            self._push(topic, message, reading, stamp)
+
+    def due(self):
+        """Check whether the flush policy asks for a flush now."""
+        if self._count == 0:
+            return False
+        if self.flush_size is not None and self._count >= self.flush_size:
+            return True
+        if self.flush_age_ms is not None:
+            age = time.ticks_diff(time.ticks_ms(), self._stamps[self._head])
+            if age >= self.flush_age_ms:
+                return True
+        return False
+
+    def drain(self):
+        """Empty the queue. Returns [(topic, [messages], [readings], oldest_stamp)] grouped by topic,
+        in queue order."""
+        groups = []
+        index = {}
+        for _ in range(self._count):
+            topic = self._topics[self._head]
+            if topic not in index:
+                index[topic] = len(groups)
+                groups.append((topic, [], [], self._stamps[self._head]))
+            group = groups[index[topic]]
+            group[1].append(self._messages[self._head])
+            group[2].append(self._readings[self._head])
+
+            self._topics[self._head] = None
+            self._messages[self._head] = None
+            self._readings[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+        self._count = 0
+        return groups
+
+    def get_stats(self):
+        """Return queue counters and current depth."""
+        return {
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "pending": self._count
+        }
+
+
 class MQTTManager:
     """Manages MQTT connections, publishing, and subscribing with optional LED feedback."""
-    def __init__(self, broker, port, username, password, client_id):
+    def __init__(self, broker, port, username, password, client_id,
+                 queue_size=0, flush_size=5, flush_age_ms=10000):
         self.broker = broker
         self.port = port
         self.username = username
@@ -43,6 +146,17 @@ class MQTTManager:
         self.client.set_callback(self.on_message)
         
         self.last_message = None
+
+        # print every published payload (slow on the Pico, debug only)
+        self.verbose = False
+
+        # optional outbound queue, enqueue() publishes directly without it
+        self.queue = PublishQueue(queue_size, flush_size, flush_age_ms) if queue_size else None
+
+        # optional store-and-forward buffer, replayed on every successful connect
+        self.offline_buffer = None
+        self.offline_topics = None
+        self.offline_scenario = "normal"
         
         print(f"MQTT Manager initialized for {broker}")
     
@@ -54,12 +168,18 @@ class MQTTManager:
             if self.led_manager:
                 self.led_manager.set_mode("MQTT_CONNECTING")
             
+            self._close_socket()
             self.client.connect()
             
             if self.led_manager:
                 self.led_manager.set_mode("MQTT_CONNECTED", duration_ms=2000)
             
             print("MQTT connected successfully!")
+            
+            if self.offline_buffer is not None and len(self.offline_buffer):
+                # Stay offline if the replay fails, newer readings then queue up
+                # behind the buffered ones instead of overtaking them
+                return self.replay_offline()
             return True
             
         except Exception as e:
@@ -70,19 +190,32 @@ class MQTTManager:
             
             return False
     
+    def _close_socket(self):
+        """Drop the socket of a failed session before reconnecting, umqtt.simple opens a new one."""
+        sock = getattr(self.client, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except Exception:
+                pass
+            self.client.sock = None
+    
     def publish(self, topic, message, retain=False):
         """Publish message to topic with automatic JSON serialization."""
         try:
             if isinstance(message, dict):
-                import json
                 message = json.dumps(message)
             
-            self.client.publish(topic.encode(), str(message).encode(), retain=retain)
+            if not isinstance(message, (bytes, bytearray)):
+                message = str(message).encode()
+            
+            self.client.publish(topic.encode(), message, retain=retain)
             
             if self.led_manager:
                 self.led_manager.set_mode("DATA_SENT", duration_ms=300)
             
-            print(f"Published to {topic}: {message}")
+            if self.verbose:
+                print(f"Published to {topic}: {message}")
             return True
             
         except Exception as e:
@@ -93,6 +226,126 @@ class MQTTManager:
             
             return False
     
+    def enqueue(self, topic, message, reading=None):
+        """Queue a message for the next flush. Publishes immediately when no queue is configured.
+        reading: (msg_id, timestamp, temperature, pressure), lets a failed flush store it offline."""
+        if self.queue is None:
+            return self.publish(topic, message)
+        
+        self.queue.put(topic, message, reading)
+        return True
+    
+    def send_reading(self, temperature_message, pressure_message, reading):
+        """Enqueue the temperature and pressure messages of one reading on the offline topics.
+        The topics that could not be sent are stored in the offline buffer with the reading,
+        so nothing is sent twice on replay. Returns False if a message failed."""
+        temperature_topic, pressure_topic = self.offline_topics
+        pending = PENDING_ALL
+        if self.enqueue(temperature_topic, temperature_message, reading):
+            if self.enqueue(pressure_topic, pressure_message, reading):
+                return True
+            pending = PENDING_PRESSURE
+        
+        self._store_offline({reading[0]: (reading, pending)})
+        return False
+    
+    def flush(self, force=False):
+        """Publish queued messages if the flush policy is met (or force is set), one frame per topic.
+        Several messages on a topic are packed as {"batch": [...]}. Returns False if any frame failed.
+        Readings of failed frames go to the offline buffer, behind the readings already stored
+        there, other messages are put back in the queue."""
+        if self.queue is None or not (force or self.queue.due()):
+            return True
+        
+        failed = []
+        for topic, messages, readings, stamp in self.queue.drain():
+            if len(messages) == 1 or isinstance(messages[0], (bytes, bytearray)):
+                # single or binary messages are sent as they are
+                for i, message in enumerate(messages):
+                    if self.publish(topic, message):
+                        self.queue.flushed += 1
+                    else:
+                        failed.append((topic, messages[i:], readings[i:], stamp))
+                        break
+            elif self.publish(topic, {"batch": messages}):
+                self.queue.flushed += len(messages)
+            else:
+                failed.append((topic, messages, readings, stamp))
+        
+        if not failed:
+            return True
+        
+        # msg_id -> (reading, PENDING_* topics not sent)
+        unsent = {}
+        for topic, messages, readings, stamp in failed:
+            bit = self._pending_bit(topic)
+            if bit is None or self.offline_buffer is None:
+                self.queue.requeue(topic, messages, readings, stamp)
+                continue
+            for message, reading in zip(messages, readings):
+                if reading is None:
+                    self.queue.requeue(topic, [message], [None], stamp)
+                else:
+                    previous = unsent.get(reading[0])
+                    unsent[reading[0]] = (reading, bit | (previous[1] if previous else 0))
+        self._store_offline(unsent)
+        return False
+    
+    def _pending_bit(self, topic):
+        """PENDING_* bit of a topic replayed from the offline buffer, None for other topics."""
+        if self.offline_topics is None:
+            return None
+        if topic == self.offline_topics[0]:
+            return PENDING_TEMPERATURE
+        if topic == self.offline_topics[1]:
+            return PENDING_PRESSURE
+        return None
+    
+    def _store_offline(self, unsent):
+        """Append {msg_id: (reading, pending)} to the offline buffer, oldest reading first."""
+        if self.offline_buffer is None:
+            return
+        for msg_id in sorted(unsent):
+            (_, timestamp, temperature, pressure), pending = unsent[msg_id]
+            self.offline_buffer.append(msg_id, timestamp, temperature, pressure, pending)
+    
+    def attach_offline_buffer(self, buffer, temperature_topic, pressure_topic, scenario="normal"):
+        """Attach an OfflineBuffer whose readings are replayed after each successful connect,
+        and that takes the readings of failed sends and flushes."""
+        self.offline_buffer = buffer
+        self.offline_topics = (temperature_topic, pressure_topic)
+        self.offline_scenario = scenario
+    
+    def _send_offline_batch(self, records):
+        """Publish buffered readings as one batch frame per topic, keeping original ids and timestamps.
+        Only the topics still pending for each reading are sent."""
+        temperature_topic, pressure_topic = self.offline_topics
+        readings = [{
+            "id": msg_id,
+            "temperature": round(temp, 1),
+            "timestamp": timestamp,
+            "scenario": self.offline_scenario
+        } for msg_id, timestamp, temp, _, pending in records if pending & PENDING_TEMPERATURE]
+        
+        if readings:
+            if not self.publish(temperature_topic, {"batch": readings}):
+                return False
+            # a failed pressure frame must not replay these temperatures again
+            self.offline_buffer.mark_sent(len(records), PENDING_TEMPERATURE)
+        pressures = [{
+            "timestamp": timestamp,
+            "pressure": round(pres, 1)
+        } for _, timestamp, _, pres, pending in records if pending & PENDING_PRESSURE]
+        return not pressures or self.publish(pressure_topic, {"batch": pressures})
+    
+    def replay_offline(self):
+        """Replay readings stored while offline. Returns True when the buffer is empty."""
+        if self.offline_buffer is None:
+            return True
+        
+        print(f"Replaying {len(self.offline_buffer)} offline readings...")
+        return self.offline_buffer.replay(self._send_offline_batch)
+    
     def subscribe(self, topic):
         """Subscribe to MQTT topic for incoming messages."""
         try:
@@ -145,8 +398,9 @@ class MQTTManager:
                 self.led_manager.set_mode("ERROR", duration_ms=500)
     
     def disconnect(self):
-        """Disconnect from MQTT broker and turn off LED."""
+        """Flush pending messages, disconnect from MQTT broker and turn off LED."""
         try:
+            self.flush(force=True)
             self.client.disconnect()
             
             if self.led_manager:
@@ -256,6 +510,92 @@ def simple_mqtt_test():
         print(f"Error: {e}")
         return False
 
+def test_store_and_forward(path="offline_test.bin"):
+    """Fail publishes at chosen points against a fake broker client and check that every
+    temperature and pressure message is delivered exactly once, in reading order, whether
+    it went out directly, through a queue flush or through the offline buffer.
+    Needs no network, runs on CPython and on the Pico."""
+    import os
+    from offline_buffer import OfflineBuffer
+
+    temperature_topic, pressure_topic = "weather/temperature", "weather/pressure"
+
+    class Client:
+        def __init__(self):
+            self.sent = []
+            self.failing = set()
+
+        def connect(self):
+            pass
+
+        def publish(self, topic, message, retain=False):
+            topic = topic.decode()
+            if topic in self.failing:
+                raise OSError("broker gone")
+            message = json.loads(message)
+            for item in message.get("batch", [message]):
+                self.sent.append((topic, item["timestamp"]))
+
+    def manager(queue_size):
+        mqtt = MQTTManager("localhost", 1883, None, None, "test", queue_size=queue_size)
+        mqtt.client = Client()
+        mqtt.attach_offline_buffer(offline, temperature_topic, pressure_topic)
+        return mqtt
+
+    def send(mqtt, msg_id):
+        reading = (msg_id, 1000 + msg_id, 20.0, 100000.0)
+        return mqtt.send_reading({"id": msg_id, "temperature": 20.0, "timestamp": 1000 + msg_id},
+                                 {"timestamp": 1000 + msg_id, "pressure": 100000.0}, reading)
+
+    def delivered(mqtt, topic):
+        return [timestamp - 1000 for t, timestamp in mqtt.client.sent if t == topic]
+
+    checks = {}
+    offline = OfflineBuffer(path, capacity=16, batch_size=4)
+    try:
+        # direct publish, the pressure of reading 2 fails after its temperature went out
+        mqtt = manager(0)
+        send(mqtt, 1)
+        mqtt.client.failing = {pressure_topic}
+        checks["partial send reported"] = not send(mqtt, 2)
+        checks["only the pressure is pending"] = [r[4] for r in offline.peek(4)] == [PENDING_PRESSURE]
+        mqtt.client.failing = set()
+        mqtt.connect()
+        checks["direct: temperatures once"] = delivered(mqtt, temperature_topic) == [1, 2]
+        checks["direct: pressures once"] = delivered(mqtt, pressure_topic) == [1, 2]
+
+        # queued, the flush fails and a replay fails halfway (pressure frame)
+        mqtt = manager(10)
+        send(mqtt, 3)
+        mqtt.client.failing = {temperature_topic}
+        checks["failed flush reported"] = not mqtt.flush(force=True)
+        checks["queue moved to the offline buffer"] = len(mqtt.queue) == 0 and len(offline) == 1
+        checks["only the temperature is pending"] = [r[4] for r in offline.peek(4)] == [PENDING_TEMPERATURE]
+        mqtt.client.failing = {temperature_topic, pressure_topic}
+        send(mqtt, 4)
+        send(mqtt, 5)
+        mqtt.flush(force=True)
+        mqtt.client.failing = {pressure_topic}
+        checks["failed replay keeps the client offline"] = not mqtt.connect()
+        mqtt.client.failing = set()
+        mqtt.connect()
+        send(mqtt, 6)
+        mqtt.flush(force=True)
+        checks["queued: temperatures once, in order"] = delivered(mqtt, temperature_topic) == [3, 4, 5, 6]
+        checks["queued: pressures once, in order"] = delivered(mqtt, pressure_topic) == [3, 4, 5, 6]
+        checks["offline buffer empty"] = len(offline) == 0
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    for name, ok in checks.items():
+        print(f"  {'OK' if ok else 'FAILED'}: {name}")
+    ok = all(checks.values())
+    print(f"Store-and-forward: {'OK' if ok else 'FAILED'}")
+    return ok
+
 if __name__ == "__main__":
     if not test_mqtt_with_led_manager():
         print("Falling back to simple test...")
@@ -0,0 +1,142 @@
+import struct
+
+# File layout: header followed by `capacity` fixed-size records used as a ring
+_MAGIC = b"SFB3"
+_HEADER_FMT = "<4sHHH"          # magic, capacity, head (oldest slot), count
+_HEADER_SIZE = struct.calcsize(_HEADER_FMT)
+_RECORD_FMT = "<IIffB"          # message id, epoch timestamp (s), temperature, pressure, pending topics
+_RECORD_SIZE = struct.calcsize(_RECORD_FMT)
+_PENDING_OFFSET = _RECORD_SIZE - 1
+
+# Topics of a reading that still have to be sent
+PENDING_TEMPERATURE = 1
+PENDING_PRESSURE = 2
+PENDING_ALL = PENDING_TEMPERATURE | PENDING_PRESSURE
+
+
+class OfflineBuffer:
+    """Store-and-forward buffer on flash for readings taken while MQTT is unreachable.
+
+    Readings are appended as fixed-size records to a circular file with a fixed
+    capacity, so flash usage never grows and the oldest reading is overwritten
+    when the buffer is full. Each record keeps the topics (PENDING_*) that still
+    have to be sent, so a reading whose temperature already went out is only
+    replayed on the pressure topic. Replay reads `batch_size` records at a time,
+    so RAM use stays bounded whatever the outage length.
+    """
+    def __init__(self, path="offline_buf.bin", capacity=720, batch_size=20):
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self._record = bytearray(_RECORD_SIZE)
+
+        self._open()
+        print(f"Offline buffer ready ({self.count}/{capacity} readings pending)")
+
+    def __len__(self):
+        return self.count
+
+    def _open(self):
+        """Load the header of an existing buffer file, or create a new one."""
+        try:
+            with open(self.path, "rb") as f:
+                magic, capacity, head, count = struct.unpack(_HEADER_FMT, f.read(_HEADER_SIZE))
+            if magic == _MAGIC and capacity == self.capacity and head < capacity and count <= capacity:
+                self.head = head
+                self.count = count
+                return
+            print("Offline buffer format changed, starting empty")
+        except (OSError, ValueError):
+            # File does not exist yet or is truncated
+            pass
+        self._create()
+
+    def _create(self):
+        """Preallocate the whole file so later writes never extend it."""
+        self.head = 0
+        self.count = 0
+        empty = bytes(_RECORD_SIZE)
+        with open(self.path, "wb") as f:
+            f.write(struct.pack(_HEADER_FMT, _MAGIC, self.capacity, 0, 0))
+            for _ in range(self.capacity):
+                f.write(empty)
+
+    def _write_header(self, f):
+        f.seek(0)
+        f.write(struct.pack(_HEADER_FMT, _MAGIC, self.capacity, self.head, self.count))
+
+    def append(self, msg_id, timestamp, temperature, pressure, pending=PENDING_ALL):
+        """Append one reading, overwriting the oldest one if the buffer is full.
+        pending: PENDING_* topics of the reading that were not sent yet."""
+        if self.count == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.dropped += 1
+        else:
+            self.count += 1
+
+        slot = (self.head + self.count - 1) % self.capacity
+        struct.pack_into(_RECORD_FMT, self._record, 0, msg_id, int(timestamp), temperature, pressure, pending)
+
+        with open(self.path, "r+b") as f:
+            f.seek(_HEADER_SIZE + slot * _RECORD_SIZE)
+            f.write(self._record)
+            self._write_header(f)
+
+    def peek(self, n):
+        """Return up to n oldest readings as (msg_id, timestamp, temperature, pressure, pending) tuples."""
+        n = min(n, self.count)
+        records = []
+        with open(self.path, "rb") as f:
+            for i in range(n):
+                slot = (self.head + i) % self.capacity
+                f.seek(_HEADER_SIZE + slot * _RECORD_SIZE)
+                f.readinto(self._record)
+                records.append(struct.unpack(_RECORD_FMT, self._record))
+        return records
+
+    def mark_sent(self, n, sent):
+        """Clear the PENDING_* bits in sent on the n oldest readings, e.g. after their
+        temperature frame went out but the pressure frame did not."""
+        n = min(n, self.count)
+        pending = bytearray(1)
+        with open(self.path, "r+b") as f:
+            for i in range(n):
+                offset = _HEADER_SIZE + (self.head + i) % self.capacity * _RECORD_SIZE + _PENDING_OFFSET
+                f.seek(offset)
+                f.readinto(pending)
+                pending[0] &= ~sent
+                f.seek(offset)
+                f.write(pending)
+
+    def consume(self, n):
+        """Drop the n oldest readings after they were delivered."""
+        n = min(n, self.count)
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+        if self.count == 0:
+            self.head = 0
+        with open(self.path, "r+b") as f:
+            self._write_header(f)
+
+    def replay(self, send_batch):
+        """Replay pending readings in batches through send_batch(records) -> bool.
+        Stops at the first failed batch, keeping it for the next replay. Returns True when empty."""
+        sent = 0
+        while self.count:
+            records = self.peek(self.batch_size)
+            if not send_batch(records):
+                print(f"Offline replay interrupted, {self.count} readings pending")
+                return False
+            self.consume(len(records))
+            sent += len(records)
+
+        if sent:
+            print(f"Offline replay complete: {sent} readings sent")
+        return True
+
+    def clear(self):
+        """Discard all pending readings."""
+        self.consume(self.count)
@@ -0,0 +1,175 @@
+import json
+import struct
+
+# Binary telemetry payload (payload_mode="binary"), little-endian:
+#   base:        magic, version, flags, id, timestamp (s), temperature (0.01 °C)
+#   prediction:  confidence (%), change per sec (1e-4 °C), per min (0.01 °C),
+#                per hour (0.01 °C), data points, prediction id
+#   scenario:    length byte + UTF-8 name
+#   burst:       samples, temp min/max (0.01 °C), temp stddev (0.001 °C),
+#                pressure min/max (Pa), pressure stddev (0.01 Pa)
+# Optional sections follow in this order when their flag is set. The burst
+# section comes last, so decoders that predate it still read the others.
+# The magic byte is not a valid UTF-8 start byte, so brokers/Node-RED never
+# mistake a binary frame for a JSON string.
+PAYLOAD_MAGIC = 0xB7
+PAYLOAD_VERSION = 1
+
+FLAG_PREDICTION = 0x01
+FLAG_SCENARIO = 0x02
+FLAG_BURST = 0x04
+
+_BASE_FMT = "<BBBIIh"
+_BASE_SIZE = struct.calcsize(_BASE_FMT)
+_PRED_FMT = "<BhhhHI"
+_PRED_SIZE = struct.calcsize(_PRED_FMT)
+_BURST_FMT = "<HhhHIIH"
+_BURST_SIZE = struct.calcsize(_BURST_FMT)
+
+
+def _fixed(value, scale, lo=-32768, hi=32767):
+    """Scale a float to a clamped fixed-point integer."""
+    return max(lo, min(hi, int(round(value * scale))))
+
+
+def encode_payload(payload):
+    """Encode a temperature payload dict to the compact binary format."""
+    flags = 0
+    if "confidence" in payload:
+        flags |= FLAG_PREDICTION
+    scenario = payload.get("scenario")
+    if scenario:
+        flags |= FLAG_SCENARIO
+    if "samples" in payload:
+        flags |= FLAG_BURST
+
+    data = struct.pack(
+        _BASE_FMT,
+        PAYLOAD_MAGIC,
+        PAYLOAD_VERSION,
+        flags,
+        payload.get("id", 0),
+        int(payload.get("timestamp", 0)),
+        _fixed(payload["temperature"], 100)
+    )
+
+    if flags & FLAG_PREDICTION:
+        data += struct.pack(
+            _PRED_FMT,
+            _fixed(payload["confidence"], 100, 0, 255),
+            _fixed(payload["change_per_sec"], 10000),
+            _fixed(payload["change_per_min"], 100),
+            _fixed(payload["change_per_hour"], 100),
+            _fixed(payload["data_points"], 1, 0, 65535),
+            payload["prediction_id"]
+        )
+
+    if flags & FLAG_SCENARIO:
+        name = scenario.encode()[:255]
+        data += bytes((len(name),)) + name
+
+    if flags & FLAG_BURST:
+        data += struct.pack(
+            _BURST_FMT,
+            _fixed(payload["samples"], 1, 0, 65535),
+            _fixed(payload["temp_min"], 100),
+            _fixed(payload["temp_max"], 100),
+            _fixed(payload["temp_std"], 1000, 0, 65535),
+            _fixed(payload["pres_min"], 1, 0, 0xFFFFFFFF),
+            _fixed(payload["pres_max"], 1, 0, 0xFFFFFFFF),
+            _fixed(payload["pres_std"], 100, 0, 65535)
+        )
+
+    return data
+
+
+def decode_payload(data):
+    """Decode a binary payload back to the dict produced by the JSON payload modes."""
+    magic, version, flags, msg_id, timestamp, temp = struct.unpack_from(_BASE_FMT, data, 0)
+    if magic != PAYLOAD_MAGIC:
+        raise ValueError("not a binary payload")
+    if version != PAYLOAD_VERSION:
+        raise ValueError(f"unsupported payload version {version}")
+
+    payload = {
+        "id": msg_id,
+        "temperature": temp / 100,
+        "timestamp": timestamp
+    }
+    offset = _BASE_SIZE
+
+    if flags & FLAG_PREDICTION:
+        conf, per_sec, per_min, per_hour, points, pred_id = struct.unpack_from(_PRED_FMT, data, offset)
+        payload["confidence"] = conf / 100
+        payload["change_per_sec"] = per_sec / 10000
+        payload["change_per_min"] = per_min / 100
+        payload["change_per_hour"] = per_hour / 100
+        payload["data_points"] = points
+        payload["prediction_id"] = pred_id
+        offset += _PRED_SIZE
+
+    if flags & FLAG_SCENARIO:
+        length = data[offset]
+        payload["scenario"] = bytes(data[offset + 1:offset + 1 + length]).decode()
+        offset += 1 + length
+
+    if flags & FLAG_BURST:
+        samples, t_min, t_max, t_std, p_min, p_max, p_std = struct.unpack_from(_BURST_FMT, data, offset)
+        payload["samples"] = samples
+        payload["temp_min"] = t_min / 100
+        payload["temp_max"] = t_max / 100
+        payload["temp_std"] = t_std / 1000
+        payload["pres_min"] = p_min
+        payload["pres_max"] = p_max
+        payload["pres_std"] = p_std / 100
+
+    return payload
+
+
+def decode_message(data):
+    """Decode a raw MQTT temperature message, binary or JSON (ingest side)."""
+    if data and data[0] == PAYLOAD_MAGIC:
+        return decode_payload(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode()
+    return json.loads(data)
+
+
+def test_payload_codec():
+    """Round-trip a large payload and compare its size with the JSON encoding."""
+    payload = {
+        "id": 42,
+        "temperature": 22.4,
+        "timestamp": 1767225600,
+        "scenario": "large_payload",
+        "confidence": 0.83,
+        "change_per_sec": -0.0012,
+        "change_per_min": -0.07,
+        "change_per_hour": -4.32,
+        "data_points": 50,
+        "prediction_id": 7,
+        # burst window statistics (BurstSampler.stats)
+        "samples": 100,
+        "temp_min": 22.31,
+        "temp_max": 22.47,
+        "temp_std": 0.042,
+        "pres_min": 101318,
+        "pres_max": 101327,
+        "pres_std": 2.31
+    }
+
+    data = encode_payload(payload)
+    decoded = decode_message(data)
+
+    print(f"JSON: {len(json.dumps(payload))} bytes, binary: {len(data)} bytes")
+    for key, value in payload.items():
+        if decoded[key] != value:
+            print(f"  Mismatch on {key}: {value} != {decoded[key]}")
+            return False
+
+    print("Payload codec test passed")
+    return True
+
+
+if __name__ == "__main__":
+    test_payload_codec()
@@ -1,5 +1,44 @@
 import time
-from machine import I2C, Pin
+from array import array
+from machine import I2C, Pin, Timer
+
+# Pressure RMS noise (Pa) with 1x oversampling and the IIR filter off (datasheet),
+# averaging n conversions divides it by sqrt(n)
+_BASE_NOISE_PA = 1.3
+_OVERSAMPLING = (1, 2, 4, 8, 16)      # index = BMP280_OS_* setting
+_CONVERSION_MS = (7, 9, 14, 23, 44)   # max conversion time per BMP280_OS_* setting
+
+# IIR filter: coefficient and samples needed to reach 75% of a step (datasheet)
+# index = BMP280_IIR_FILTER_* setting
+_IIR_COEFFICIENT = (1, 2, 4, 8, 16)
+_IIR_STEP_SAMPLES = (1, 2, 5, 11, 22)
+
+
+def estimate_noise(oss, iir):
+    """Approximate pressure RMS noise (Pa) for an oversampling and IIR setting."""
+    # a first order IIR with coefficient c scales the variance by 1/(2c-1)
+    c = _IIR_COEFFICIENT[iir]
+    return _BASE_NOISE_PA / (_OVERSAMPLING[oss] * (2 * c - 1)) ** 0.5
+
+
+def choose_sampling(interval_s, noise_target_pa, max_lag_s=60):
+    """Cheapest (oversampling, iir) setting reaching the noise target.
+    Oversampling costs conversion time (current), the IIR filter is free but
+    delays step changes by several samples, so it is only used while that
+    delay stays under max_lag_s at the given interval."""
+    for oss in range(len(_OVERSAMPLING)):
+        for iir in range(len(_IIR_COEFFICIENT)):
+            if iir and _IIR_STEP_SAMPLES[iir] * interval_s > max_lag_s:
+                break
+            if estimate_noise(oss, iir) <= noise_target_pa:
+                return oss, iir
+    # target not reachable, use the lowest noise setting within the lag limit
+    oss = len(_OVERSAMPLING) - 1
+    for iir in range(len(_IIR_COEFFICIENT) - 1, 0, -1):
+        if _IIR_STEP_SAMPLES[iir] * interval_s <= max_lag_s:
+            return oss, iir
+    return oss, 0
+
 
 class WeatherSensor:
     """BMP280 sensor manager for reading temperature and pressure via I2C."""
@@ -18,8 +57,7 @@ class WeatherSensor:
             print("BMP280 sensor connected successfully")
             
             # test reading
-            temp = self.sensor.temperature
-            pres = self.sensor.pressure
+            temp, pres = self.sensor.read_compensated()
             print(f"  Test reading: {temp:.1f}°C, {pres:.1f}Pa")
             
         except Exception as e:
@@ -28,14 +66,15 @@ class WeatherSensor:
             self.connected = False
             self.sensor = None
     
-    def read(self):
-        """Read temperature and pressure from sensor. Returns tuple: (temp, pressure) or (None, None) on error."""
+    def read(self, fresh=False):
+        """Read temperature and pressure from sensor. Returns tuple: (temp, pressure) or (None, None) on error.
+        fresh=True always reads the data registers instead of reusing a recent burst."""
         if not self.connected or self.sensor is None:
             return None, None
         
         try:
-            temp = self.sensor.temperature
-            pres = self.sensor.pressure
+            # one I2C burst for both values
+            temp, pres = self.sensor.read_compensated(force=fresh)
             
             temperature = round(temp, 1)
             pressure = round(pres, 1)
@@ -102,6 +141,270 @@ class WeatherSensor:
             return {"type": "BMP280", "connected": True}
 
 
+class _SlotScheduler:
+    """Sleeps until fixed slots anchored to the start time, so the sample
+    period does not drift with processing or publishing time."""
+    def __init__(self, interval_s):
+        self.interval_ms = int(interval_s * 1000)
+        self._next = time.ticks_ms()
+
+    def stop(self):
+        """Stop sampling (nothing runs between slots)."""
+        pass
+
+    def wait(self):
+        """Sleep until the next sampling slot."""
+        self._next = time.ticks_add(self._next, self.interval_ms)
+        delay = time.ticks_diff(self._next, time.ticks_ms())
+        if delay > 0:
+            time.sleep_ms(delay)
+        else:
+            # overran the slot, restart the schedule from now
+            self._next = time.ticks_ms()
+
+
+class ForcedSampler(_SlotScheduler):
+    """Power-aware sampling scheduler using the BMP280 forced mode.
+
+    The chip sleeps between samples: each read() starts one conversion, polls
+    the status register until it is done and reads the result, after which the
+    chip is back in sleep mode on its own. wait() sleeps until the next slot.
+    """
+    def __init__(self, sensor, interval_s, noise_target_pa=1.0, max_lag_s=60):
+        _SlotScheduler.__init__(self, interval_s)
+        self.sensor = sensor
+        self.oss, self.iir = choose_sampling(interval_s, noise_target_pa, max_lag_s)
+        self.noise_pa = estimate_noise(self.oss, self.iir)
+        self.timestamp = None   # epoch seconds of the last read() sample
+
+        bmp = sensor.sensor
+        if bmp is not None:
+            bmp.sleep()
+            bmp.oversample(self.oss)
+            bmp.iir = self.iir
+            # upper bound of the conversion time, set by oversample()
+            self.measure_ms = bmp.read_wait_ms
+        else:
+            self.measure_ms = 0
+
+        print(f"Forced mode sampling: every {interval_s}s, oversampling x{_OVERSAMPLING[self.oss]}, "
+              f"IIR {_IIR_COEFFICIENT[self.iir]}, ~{self.noise_pa:.2f} Pa noise")
+
+    def read(self):
+        """Run one forced conversion and return (temp, pressure) or (None, None) on error."""
+        bmp = self.sensor.sensor
+        if not self.sensor.is_connected() or bmp is None:
+            return None, None
+
+        self.timestamp = time.time()
+        try:
+            bmp.force_measure()
+            # conversion takes at most measure_ms, poll the status bit after that
+            time.sleep_ms(self.measure_ms)
+            deadline = time.ticks_add(time.ticks_ms(), self.measure_ms)
+            while bmp.is_measuring:
+                if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                    break
+                time.sleep_ms(1)
+        except Exception as e:
+            print(f"Forced measurement error: {e}")
+            return None, None
+
+        return self.sensor.read(fresh=True)
+
+
+class TimerSampler(ForcedSampler):
+    """Timer-driven forced-mode sampling with a lock-free ring buffer.
+
+    A periodic machine.Timer fires every interval. Its callback reads the
+    conversion started on the previous tick and starts the next one, so it
+    never waits for the sensor, and stores the result stamped with the time
+    the conversion was started. The callback is the only writer of _head, the
+    main loop the only writer of _tail, so no lock is needed. When the buffer
+    is full new samples are dropped and counted.
+
+    read() returns the oldest buffered sample and blocks until one is
+    available, publishing delays no longer shift the sampling cadence. If no
+    sample arrives within two intervals (e.g. the callback keeps failing on
+    an I2C fault) it returns (None, None), so the caller's loop keeps running.
+    """
+    def __init__(self, sensor, interval_s, noise_target_pa=1.0, max_lag_s=60, capacity=32):
+        ForcedSampler.__init__(self, sensor, interval_s, noise_target_pa, max_lag_s)
+        self.capacity = capacity
+        self._stamps = array('i', bytearray(4 * capacity))
+        self._temps = array('f', bytearray(4 * capacity))
+        self._press = array('f', bytearray(4 * capacity))
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._pending = None   # start time of the conversion in progress
+        self._timer = Timer()
+        self._timer.init(period=self.interval_ms, mode=Timer.PERIODIC, callback=self._tick)
+
+    def _tick(self, t):
+        # soft IRQ: runs between bytecodes, I2C access is allowed
+        bmp = self.sensor.sensor
+        try:
+            if self._pending is not None:
+                temp, pres = bmp.read_compensated(force=True)
+                nxt = (self._head + 1) % self.capacity
+                if nxt == self._tail:
+                    self.dropped += 1
+                else:
+                    i = self._head
+                    self._stamps[i] = self._pending
+                    self._temps[i] = temp
+                    self._press[i] = pres
+                    # publish the slot only after it is written
+                    self._head = nxt
+            self._pending = int(time.time())
+            bmp.force_measure()
+        except Exception:
+            self.errors += 1
+            self._pending = None
+
+    def __len__(self):
+        return (self._head - self._tail) % self.capacity
+
+    def read(self):
+        """Oldest buffered (temp, pressure), waits for the next sample if the buffer is empty.
+        Returns (None, None) if none arrives within two sample intervals."""
+        if not self.sensor.is_connected() or self.sensor.sensor is None:
+            return None, None
+
+        start = time.ticks_ms()
+        while self._head == self._tail:
+            if time.ticks_diff(time.ticks_ms(), start) >= 2 * self.interval_ms:
+                print(f"No sample in {2 * self.interval_ms} ms ({self.errors} sensor errors)")
+                return None, None
+            # the timer callback still runs while sleeping
+            time.sleep_ms(10)
+
+        i = self._tail
+        self.timestamp = self._stamps[i]
+        temp = round(self._temps[i], 1)
+        pres = round(self._press[i], 1)
+        self._tail = (i + 1) % self.capacity
+        return temp, pres
+
+    def wait(self):
+        """Nothing to do, the timer sets the cadence and read() waits for samples."""
+        pass
+
+    def stop(self):
+        """Stop the sampling timer."""
+        self._timer.deinit()
+
+
+def window_stats(buf, n):
+    """Return (min, max, mean, stddev) of the first n values of an int buffer."""
+    # sums of offsets from the first value keep the integers small
+    x0 = buf[0]
+    lo = hi = x0
+    s = 0
+    ss = 0
+    for i in range(n):
+        x = buf[i]
+        if x < lo:
+            lo = x
+        elif x > hi:
+            hi = x
+        d = x - x0
+        s += d
+        ss += d * d
+    mean = s / n
+    var = ss / n - mean * mean
+    return lo, hi, x0 + mean, (var if var > 0 else 0) ** 0.5
+
+
+class BurstSampler(_SlotScheduler):
+    """High-rate capture reduced on the device, one reading per publish interval.
+
+    read() samples at rate_hz for window_s (by default 80% of the interval,
+    the rest is left for publishing) into preallocated int buffers, puts the
+    chip back to sleep and returns the window means. The min/max/stddev of the
+    window are kept in stats. Same read()/wait() interface as ForcedSampler.
+    """
+    def __init__(self, sensor, interval_s, rate_hz=25, window_s=None, max_samples=500):
+        _SlotScheduler.__init__(self, interval_s)
+        self.sensor = sensor
+        self.period_ms = int(1000 / rate_hz)
+        if window_s is None:
+            window_s = interval_s * 0.8
+        self.size = max(1, min(int(window_s * rate_hz), max_samples))
+        self.stats = None
+        self.timestamp = None   # epoch seconds of the last window start
+
+        # raw samples in 0.01 C and Pa, filled without allocating
+        self._temps = array('i', bytearray(4 * self.size))
+        self._press = array('i', bytearray(4 * self.size))
+
+        # highest oversampling whose conversion fits the sample period
+        self.oss = 0
+        for oss in range(len(_CONVERSION_MS)):
+            if _CONVERSION_MS[oss] < self.period_ms:
+                self.oss = oss
+
+        bmp = sensor.sensor
+        if bmp is not None:
+            bmp.sleep()
+            bmp.oversample(self.oss)
+            # IIR off, the window statistics replace it and spikes stay visible
+            bmp.iir = 0
+            bmp.standby = 0
+
+        print(f"Burst sampling: {self.size} samples at {rate_hz} Hz every {interval_s}s, "
+              f"oversampling x{_OVERSAMPLING[self.oss]}")
+
+    def read(self):
+        """Capture one window and return the mean (temp, pressure) or (None, None) on error."""
+        bmp = self.sensor.sensor
+        if not self.sensor.is_connected() or bmp is None:
+            return None, None
+
+        temps = self._temps
+        press = self._press
+        n = 0
+        self.timestamp = time.time()
+        try:
+            # continuous conversions while the window lasts
+            bmp.normal_measure()
+            time.sleep_ms(_CONVERSION_MS[self.oss])
+            due = time.ticks_ms()
+            while n < self.size:
+                temps[n], press[n] = bmp.read_compensated_int(force=True)
+                n += 1
+                due = time.ticks_add(due, self.period_ms)
+                delay = time.ticks_diff(due, time.ticks_ms())
+                if delay > 0:
+                    time.sleep_ms(delay)
+        except Exception as e:
+            print(f"Burst capture error: {e}")
+        finally:
+            # back to sleep even after an error, normal mode would keep converting
+            try:
+                bmp.sleep()
+            except Exception:
+                pass
+        if n == 0:
+            return None, None
+
+        t_min, t_max, t_mean, t_std = window_stats(temps, n)
+        p_min, p_max, p_mean, p_std = window_stats(press, n)
+        self.stats = {
+            "samples": n,
+            "temp_min": t_min / 100,
+            "temp_max": t_max / 100,
+            "temp_std": round(t_std / 100, 3),
+            "pres_min": p_min,
+            "pres_max": p_max,
+            "pres_std": round(p_std, 2),
+        }
+        return round(t_mean / 100, 1), round(p_mean, 1)
+
+
 def test_bmp280():
     """Test BMP280 sensor with multiple readings and I2C bus scanning."""
     print("\n" + "="*50)
@@ -120,6 +423,9 @@ def test_bmp280():
     print("\nSensor connected!")
     print(f"Sensor info: {sensor.get_sensor_info()}")
     
+    # 32-bit integer compensation against the datasheet formula and the 64-bit routine
+    sensor.sensor.verify_int32()
+    
     print("\nTaking 5 readings (2 seconds apart):")
     print("-" * 40)
     
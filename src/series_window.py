@@ -0,0 +1,108 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+def to_datetime64(t):
+    """Convert an aware datetime to a naive UTC datetime64[ns]."""
+    return np.datetime64(t.astimezone(timezone.utc).replace(tzinfo=None), "ns")
+
+
+def flux_time(t):
+    """Format a datetime64 (UTC) or an aware datetime as a Flux time literal (RFC3339)."""
+    if isinstance(t, datetime):
+        t = to_datetime64(t)
+    return np.datetime_as_string(t, unit="us") + "Z"
+
+
+class SeriesWindow:
+    """In-memory sliding window of (time, value) points for one series.
+
+    The first refresh loads the whole range, later refreshes only fetch the
+    points from `lookback` before the last timestamp seen, replace that span of
+    the window with them and evict points that fell out of the range, so each
+    poll costs O(points in the lookback) of Influx work. Readings are written
+    late with their sample time (queue flushes, offline replay), the lookback
+    has to cover that delay for them to enter the window.
+    """
+    def __init__(self, range_seconds, fetch, lookback_seconds=0):
+        # fetch(start) -> (times, values) NumPy columns, start is a Flux time
+        # literal, times are datetime64[ns] in UTC
+        # lookback_seconds: how far behind the last point each refresh re-fetches
+        self.range = timedelta(seconds=range_seconds)
+        self.lookback = np.timedelta64(timedelta(seconds=lookback_seconds))
+        self.fetch = fetch
+        self.times = np.empty(0, dtype="datetime64[ns]")
+        self.values = np.empty(0)
+        self._lock = threading.Lock()
+
+    @property
+    def last_time(self):
+        return self.times[-1] if len(self.times) else None
+
+    def refresh(self):
+        """Re-fetch the points since the last one seen minus the lookback and evict expired points."""
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            range_start = to_datetime64(now - self.range)
+            last = self.last_time
+            start = range_start if last is None else max(last - self.lookback, range_start)
+            times, values = self.fetch(flux_time(start))
+
+            # range start is inclusive, the fetched points replace the window from
+            # start on, so late points are merged in and none is held twice
+            order = np.argsort(times, kind="stable")
+            keep = np.searchsorted(self.times, start)
+            self.times = np.concatenate((self.times[:keep], times[order]))
+            self.values = np.concatenate((self.values[:keep], values[order]))
+
+            cutoff = np.searchsorted(self.times, range_start)
+            if cutoff:
+                self.times = self.times[cutoff:]
+                self.values = self.values[cutoff:]
+
+    def snapshot(self, since=None):
+        """Return (times, values) arrays, only points newer than `since` (aware datetime) if given."""
+        with self._lock:
+            i = np.searchsorted(self.times, to_datetime64(since), side="right") if since is not None else 0
+            return self.times[i:], self.values[i:]
+
+
+def parse_since(value):
+    """Parse a since= query parameter (RFC3339 or epoch seconds). Returns None if missing."""
+    if not value:
+        return None
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    except ValueError:
+        t = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return t if t.tzinfo else t.replace(tzinfo=timezone.utc)
+
+
+def test_series_window():
+    """Refresh a window against an in-memory series, with a point written late
+    with an older timestamp (as an offline replay does)."""
+    now = to_datetime64(datetime.now(timezone.utc))
+    second = np.timedelta64(1, "s")
+    series = {now - 50 * second: 1.0, now - 40 * second: 2.0}
+
+    def fetch(start):
+        start = np.datetime64(start[:-1], "ns")
+        times = np.array(sorted(t for t in series if t >= start), dtype="datetime64[ns]")
+        return times, np.array([series[t] for t in times])
+
+    window = SeriesWindow(60, fetch, lookback_seconds=30)
+    window.refresh()
+    series[now - 20 * second] = 4.0
+    series[now - 45 * second] = 1.5  # late, older than the last point seen
+    window.refresh()
+    window.refresh()
+    times, values = window.snapshot()
+    ok = list(values) == [1.0, 1.5, 2.0, 4.0] and bool(np.all(np.diff(times) > np.timedelta64(0)))
+    print(f"Series window: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+if __name__ == "__main__":
+    test_series_window()
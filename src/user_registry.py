@@ -1,35 +1,190 @@
+"""
+User registry: username -> {"age": age_class, "sex": sex}
+
+The registry is kept in memory and loaded once. USER_FILE holds a JSON
+snapshot (same format as the original registry file), registrations are
+appended as one JSON line each to USER_FILE + ".log". When the log has as many
+entries as the registry has users, the snapshot is rewritten to a temporary
+file and renamed over USER_FILE, then the log is cleared, so every write is
+O(1) amortized and a power loss never leaves a half-written snapshot. A torn
+last log line is ignored on load. Works on MicroPython and CPython.
+"""
+
 import json
+import os
 
 USER_FILE = "users_reg.json"
 
+# Compact once the log has this many entries, or as many as there are users
+COMPACT_MIN_ENTRIES = 16
 
-def load_users():
-    """Load user registry from JSON file. Returns empty dict if file doesn't exist."""
+# In-memory index and the state of the files it was loaded from
+_users = None
+_path = None
+_log_entries = 0
+_signature = None
+
+# os.replace overwrites the target atomically on every CPython platform
+_replace = getattr(os, "replace", os.rename)
+
+
+def _log_file():
+    return USER_FILE + ".log"
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+        return st[6], st[8]  # size, mtime
+    except OSError:
+        return None
+
+
+def _files_signature():
+    return _file_signature(USER_FILE), _file_signature(_log_file())
+
+
+def _load():
+    """Read the snapshot and replay the log into the in-memory index."""
+    global _users, _path, _log_entries, _signature
+    users = {}
     try:
         with open(USER_FILE, "r") as f:
-            return json.load(f)
+            users = json.load(f)
     except OSError:
         # File does not exist yet
-        return {}
+        pass
+    except ValueError:
+        print(f"User registry: {USER_FILE} is not valid JSON, starting from the log")
+
+    entries = 0
+    torn = False
+    try:
+        with open(_log_file(), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    users[entry["user"]] = {"age": entry["age"], "sex": entry["sex"]}
+                except (ValueError, KeyError, TypeError):
+                    # Torn write at power loss, only the last line can be affected
+                    torn = True
+                    break
+                entries += 1
+    except OSError:
+        pass
+
+    _users = users
+    _path = USER_FILE
+    _log_entries = entries
+    _signature = _files_signature()
+    if torn:
+        # New entries would be appended to the torn line, start a clean log
+        compact()
+
+
+def _index():
+    if _users is None or _path != USER_FILE:
+        _load()
+    return _users
+
+
+def reload():
+    """Reload the registry if its files changed on disk (e.g. a copy synced from the Pico)."""
+    if _users is None or _path != USER_FILE or _files_signature() != _signature:
+        _load()
+
+
+def load_users():
+    """Return a copy of the registry, reloaded if its files changed. Empty dict if there is none."""
+    reload()
+    return {name: dict(user) for name, user in _users.items()}
 
 
 def save_users(users):
-    """Save user registry to JSON file."""
-    with open(USER_FILE, "w") as f:
+    """Replace the registry with users, written as a new snapshot."""
+    global _users, _path
+    _users = {name: dict(user) for name, user in users.items()}
+    _path = USER_FILE
+    compact()
+
+
+def compact():
+    """Write the index to a new snapshot, rename it over USER_FILE and clear the log."""
+    global _log_entries, _signature
+    users = _index()
+    tmp = USER_FILE + ".tmp"
+    with open(tmp, "w") as f:
         json.dump(users, f)
+    _replace(tmp, USER_FILE)
+
+    # Entries still in the log after a crash here are replayed over the same values
+    try:
+        os.remove(_log_file())
+    except OSError:
+        pass
+    _log_entries = 0
+    _signature = _files_signature()
 
 
 def get_user(username):
     """Retrieve user data by username. Returns dict with age and sex, or None if not found."""
-    users = load_users()
-    return users.get(username)
+    user = _index().get(username)
+    return dict(user) if user is not None else None
 
 
 def register_user(username, age, sex):
-    """Register a new user with age and sex, storing in JSON registry."""
-    users = load_users()
+    """Register a new user with age and sex, or update an existing one."""
+    global _log_entries, _signature
+    users = _index()
     users[username] = {
         "age": age,
         "sex": sex
     }
-    save_users(users)
+
+    with open(_log_file(), "a") as f:
+        f.write(json.dumps({"user": username, "age": age, "sex": sex}) + "\n")
+    _log_entries += 1
+
+    if _log_entries >= max(COMPACT_MIN_ENTRIES, len(users)):
+        compact()
+    else:
+        _signature = _files_signature()
+
+
+def test_user_registry(path="users_test.json"):
+    """Register, reload and compact a scratch registry, including a torn log line."""
+    global USER_FILE, _users
+    saved = USER_FILE
+    USER_FILE = path
+    ok = True
+    try:
+        save_users({})
+        for i in range(40):
+            register_user(f"user{i}", i % 4, i % 2)
+        register_user("user0", 3, 1)
+
+        with open(_log_file(), "a") as f:
+            f.write('{"user": "torn", "age"')
+
+        _users = None  # as after a reboot
+        ok = len(load_users()) == 40 and get_user("user0") == {"age": 3, "sex": 1} \
+            and get_user("user39") == {"age": 3, "sex": 1} and get_user("torn") is None
+        register_user("user1", 0, 0)
+        register_user("user1", 1, 1)
+        _users = None
+        ok = ok and load_users() == {f"user{i}": {"age": 3 if i == 0 else i % 4, "sex": 1 if i == 0 else i % 2}
+                                     for i in range(40)}
+        print(f"User registry: {'OK' if ok else 'FAILED'}")
+    finally:
+        for p in (path, path + ".log", path + ".tmp"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        USER_FILE = saved
+        _users = None
+    return ok
+
+
+if __name__ == "__main__":
+    test_user_registry()
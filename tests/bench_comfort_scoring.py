@@ -0,0 +1,64 @@
+"""
+Microbenchmark: comfort scoring on the backend (src/comfort_scoring.py)
+Compares a per-row Python loop over ComfortML.predict with the vectorized
+ComfortScorer on 1M (age_class, sex, temperature) rows.
+
+Run from the repository root: python tests/bench_comfort_scoring.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from comfort_HVAC import ComfortML
+from comfort_scoring import ComfortScorer
+
+ROWS = 1_000_000
+
+
+def make_rows(n, seed=42):
+    rng = np.random.default_rng(seed)
+    age = rng.integers(0, 4, n)
+    sex = rng.integers(0, 2, n)
+    temperature = np.round(rng.uniform(10, 40, n), 1)
+    return age, sex, temperature
+
+
+def loop_path(model, age, sex, temperature):
+    """One ComfortML.predict call per row, as the firmware scores readings."""
+    probs = []
+    for a, s, t in zip(age.tolist(), sex.tolist(), temperature.tolist()):
+        probs.append(model.predict(a, s, t)[1])
+    return np.array(probs)
+
+
+def vector_path(scorer, age, sex, temperature):
+    """A single vectorized call over all rows."""
+    return scorer.probability(age, sex, temperature)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    model = ComfortML()
+    scorer = ComfortScorer(model)
+    age, sex, temperature = make_rows(ROWS)
+
+    t_loop, p_loop = timed(loop_path, model, age, sex, temperature)
+    t_vec, p_vec = timed(vector_path, scorer, age, sex, temperature)
+
+    max_diff = float(np.max(np.abs(p_loop - p_vec)))
+    labels_agree = np.mean((p_loop >= model.threshold) == (p_vec >= scorer.threshold))
+    assert max_diff < 1e-12, "paths disagree"
+
+    print(f"{'rows':>10} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    print(f"{ROWS:>10} {t_loop:>10.3f} {t_vec:>15.4f} {t_loop / t_vec:>7.0f}x")
+    print(f"max |diff| {max_diff:.2e}, labels agree on {labels_agree * 100:.4f}% of rows")
@@ -0,0 +1,91 @@
+"""
+Microbenchmark: Flux result conversion in src/app.py
+Compares the per-record path (FluxTable records + strftime) with the columnar
+path (raw CSV -> NumPy columns) on synthetic responses of 10k, 100k and 1M points.
+
+Run from the repository root: python tests/bench_query_conversion.py
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from influxdb_client.client.flux_csv_parser import FluxCsvParser, FluxSerializationMode
+from influx_columns import parse_csv_columns, format_times, values_to_list
+
+SIZES = [10_000, 100_000, 1_000_000]
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class _Response:
+    """Minimal stand-in for the urllib3 response the client parses."""
+    closed = True
+
+    def __init__(self, data):
+        self.data = data
+
+    def close(self):
+        pass
+
+
+def _rows(n):
+    for i in range(n):
+        t = (START + timedelta(seconds=2 * i, microseconds=i % 1000)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        yield f",_result,0,2026-01-01T00:00:00Z,2026-01-02T00:00:00Z,{t},{20 + (i % 100) / 10},temperature,weather,bmp280\r\n"
+
+
+def annotated_csv(n):
+    """Response body as sent for query() (annotated CSV)."""
+    head = (
+        "#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,double,string,string,string\r\n"
+        "#group,false,false,true,true,false,false,true,true,true\r\n"
+        "#default,_result,,,,,,,,\r\n"
+        ",result,table,_start,_stop,_time,_value,_field,_measurement,sensor\r\n"
+    )
+    return (head + "".join(_rows(n))).encode()
+
+
+def plain_csv(n):
+    """Response body as sent for query_raw() with CSV_DIALECT (no annotations)."""
+    head = ",result,table,_start,_stop,_time,_value,_field,_measurement,sensor\r\n"
+    return (head + "".join(_rows(n))).encode()
+
+
+def record_path(data):
+    """Previous query_influx: FluxTable records, one strftime per row."""
+    parser = FluxCsvParser(response=_Response(data), serialization_mode=FluxSerializationMode.tables)
+    list(parser.generator())
+    xvalues = []
+    yvalues = []
+    for table in parser.tables:
+        for record in table.records:
+            xvalues.append(record.get_time().strftime("%H:%M:%S"))
+            try:
+                yvalues.append(record.get_value())
+            except:
+                yvalues.append(None)
+    return xvalues, yvalues
+
+
+def columnar_path(data):
+    """Current query_influx: CSV parsed to NumPy columns, times formatted in bulk."""
+    times, values = parse_csv_columns(data)
+    return format_times(times), values_to_list(values)
+
+
+def timed(fn, data):
+    start = time.perf_counter()
+    result = fn(data)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    print(f"{'points':>10} {'records (s)':>12} {'columnar (s)':>13} {'speedup':>8}")
+    for n in SIZES:
+        t_old, (x_old, y_old) = timed(record_path, annotated_csv(n))
+        t_new, (x_new, y_new) = timed(columnar_path, plain_csv(n))
+        assert x_old == x_new and y_old == y_new, "paths disagree"
+        print(f"{n:>10} {t_old:>12.3f} {t_new:>13.3f} {t_old / t_new:>7.1f}x")